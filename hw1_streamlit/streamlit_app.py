@@ -1,5 +1,7 @@
 import aiohttp
+import hashlib
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import asyncio
@@ -27,32 +29,43 @@ async def fetch_temperature(city: str, api_key: str) -> (int, float | str):
     except aiohttp.ClientError as e:
         return -1, str(e)
 
-def detect_anomalies(city_data, season_stats):
+def detect_anomalies_all(data):
     """
-    Определяет аномалии в данных по температуре.
+    Определяет аномалии сразу для всех городов.
+
+    Среднее и отклонение считаются одним groupby по (city, season), границы
+    раздаются строкам по номеру группы, а сравнение выполняется одним
+    векторным проходом NumPy по всему набору данных.
 
     Аргументы:
-    - city_data: DataFrame с данными о температуре.
-    - season_stats: DataFrame с сезонной статистикой (mean, std).
+    - data: DataFrame с данными о температуре по всем городам.
 
     Возвращает:
-    - DataFrame с добавленной колонкой `is_anomaly`.
+    - (DataFrame с колонками `is_anomaly` и `rolling_mean`, сезонная статистика).
     """
-    city_data = city_data.copy()
-    city_data['is_anomaly'] = False  # Изначально помечаем все как нормальные
-    for season, stats in season_stats.iterrows():
-        mean_temp = stats['mean']
-        std_temp = stats['std']
-        lower_bound = mean_temp - 2 * std_temp
-        upper_bound = mean_temp + 2 * std_temp
-
-        # Помечаем аномалии
-        is_season = city_data['season'] == season
-        city_data.loc[is_season, 'is_anomaly'] = ~city_data[is_season]['temperature'].between(lower_bound, upper_bound)
-
-    # Добавляем скользящее среднее
-    city_data['rolling_mean'] = city_data['temperature'].rolling(window=30, center=True).mean()
-    return city_data
+    data = data.copy()
+    groups = data.groupby(['city', 'season'], observed=True)
+    season_stats = groups['temperature'].agg(['mean', 'std'])
+
+    # Номер группы каждой строки совпадает с позицией группы в season_stats;
+    # строки без города или сезона не входят ни в одну группу (ngroup = NaN),
+    # им достается номер -1 и добавленная в конец пустая граница
+    codes = groups.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    grouped = codes >= 0
+    mean_temp = np.append(season_stats['mean'].to_numpy(), np.nan)[codes]
+    std_temp = np.append(season_stats['std'].to_numpy(), np.nan)[codes]
+    temperature = data['temperature'].to_numpy()
+    # Как и Series.between: строка без границ (std = NaN) считается аномалией;
+    # строки без группы сравнивать не с чем, они аномалиями не считаются
+    data['is_anomaly'] = grouped & ~((temperature >= mean_temp - 2 * std_temp) & (temperature <= mean_temp + 2 * std_temp))
+
+    # Скользящее среднее по каждому городу отдельно
+    data['rolling_mean'] = (
+        data.groupby('city', observed=True, sort=False)['temperature']
+        .rolling(window=30, center=True).mean()
+        .reset_index(level=0, drop=True)
+    )
+    return data, season_stats
 
 async def analyze_temperature(city_data, selected_city, api_key, season_stats):
     """
@@ -84,6 +97,34 @@ async def analyze_temperature(city_data, selected_city, api_key, season_stats):
     except Exception as e:
         st.error(f"Ошибка: {e}")
 
+# Этапы анализа кэшируются между перезапусками скрипта: выбор города или ввод
+# API-ключа не повторяют чтение файла и расчеты. Аргументы с "_" не входят в ключ.
+# Большие таблицы - в cache_resource (без копирования), срезы по городу - в cache_data.
+CACHE_TTL = 60 * 60
+CACHE_MAX_ENTRIES = 32
+DATA_MAX_ENTRIES = 4
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def get_file_hash(file_id, _file_upload):
+    """Хэш содержимого считается один раз на загрузку файла."""
+    return hashlib.sha256(_file_upload.getvalue()).hexdigest()
+
+@st.cache_resource(max_entries=DATA_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner='Загрузка данных...')
+def load_data(digest, _file_upload):
+    _file_upload.seek(0)
+    return pd.read_csv(_file_upload)
+
+@st.cache_resource(max_entries=DATA_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner='Поиск аномалий...')
+def analyze_all(digest, _data):
+    """Аномалии и сезонная статистика сразу для всех городов."""
+    data = _data.assign(timestamp=pd.to_datetime(_data['timestamp']))  # Преобразуем timestamp в datetime
+    return detect_anomalies_all(data)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def city_analysis(digest, city, _analyzed, _all_season_stats):
+    """Данные и сезонная статистика выбранного города."""
+    return _analyzed[_analyzed['city'] == city], _all_season_stats.loc[city]
+
 def main():
     # Настройка страницы
     st.set_page_config(
@@ -101,7 +142,8 @@ def main():
     if file_upload is not None:
         try:
             # Попытка загрузить данные
-            data = pd.read_csv(file_upload)
+            digest = get_file_hash(file_upload.file_id, file_upload)
+            data = load_data(digest, file_upload)
 
             # Проверка на наличие необходимых колонок
             required_columns = {'city', 'timestamp', 'temperature', 'season'}
@@ -117,25 +159,21 @@ def main():
         st.info("Пожалуйста, загрузите CSV-файл с историческими данными.")
         return
 
-    # Преобразование данных
-    data['timestamp'] = pd.to_datetime(data['timestamp'])  # Преобразуем timestamp в datetime
+    # Аномалии и сезонная статистика сразу для всех городов
+    analyzed, all_season_stats = analyze_all(digest, data)
 
     # Выбор города
-    cities = data['city'].unique()
+    cities = all_season_stats.index.unique(level='city')
     selected_city = st.selectbox("Выберите город для анализа", cities)
-    city_data = data[data['city'] == selected_city]
+    city_data, season_stats = city_analysis(digest, selected_city, analyzed, all_season_stats)
 
     # Ввод API ключа
     api_key = st.text_input('Введите API ключ OpenWeatherMap для текущей температуры')
 
     # Расчёт статистики
     st.subheader(f'Статистика по городу: {selected_city}')
-    season_stats = city_data.groupby('season')['temperature'].agg(['mean', 'std'])
     st.dataframe(season_stats)
 
-    # Добавление аномалий
-    city_data = detect_anomalies(city_data, season_stats)
-
     # Визуализация временных рядов с точками
     st.subheader(f'Временные ряды температуры для города: {selected_city}')
 
@@ -1,8 +1,70 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
 from temperature_analysis import analyze_temperature, detect_anomalies
+from ingestion import MissingColumnsError, file_hash, load_all, load_city, load_dataset, open_dataset
+from parallel_analysis import analyze_parallel
 import asyncio
+import os
+
+# Этапы анализа кэшируются между перезапусками скрипта: выбор города или ввод
+# API-ключа не повторяют загрузку и расчеты. Аргументы с "_" не входят в ключ.
+CACHE_TTL = 60 * 60
+CACHE_MAX_ENTRIES = 32
+# ANALYSIS_WORKERS > 1 включает анализ всех городов сразу в пуле процессов
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '1'))
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def get_file_hash(file_id, _file_upload):
+    """Хэш содержимого считается один раз на загрузку файла."""
+    return file_hash(_file_upload)
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner='Загрузка данных...')
+def get_dataset_stats(digest, _file_upload):
+    """Колоночный кэш файла и сезонная статистика всех городов."""
+    return load_dataset(_file_upload, digest=digest)
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL)
+def get_dataset(cache_path):
+    return open_dataset(cache_path)
+
+
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner='Анализ всех городов...')
+def get_all_cities_analysis(cache_path):
+    """Аномалии всех городов из кэша файла, посчитанные analyze_parallel; результат только читается."""
+    analyzed, _ = analyze_parallel(load_all(get_dataset(cache_path)), ANALYSIS_WORKERS)
+    return analyzed
+
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL, show_spinner=False)
+def get_city_analysis(cache_path, city, _season_stats):
+    """Данные города с аномалиями и скользящим средним."""
+    if ANALYSIS_WORKERS > 1:
+        # Весь набор анализируется один раз, дальше выбор города - срез готового результата
+        analyzed = get_all_cities_analysis(cache_path)
+        return analyzed[analyzed['city'] == city]
+    return detect_anomalies(load_city(get_dataset(cache_path), city), _season_stats)
+
+
+def forget_cache_path(digest, cache_path):
+    """Сбрасывает этапы, которые ссылаются на каталог кэша, удаленный evict_cache."""
+    get_dataset_stats.clear(digest, None)
+    get_dataset.clear(cache_path)
+    get_all_cities_analysis.clear(cache_path)
+    # Ключ анализа включает город: сбрасываются все записи
+    get_city_analysis.clear()
+
+
+def get_cached_dataset(digest, file_upload):
+    """Каталог кэша и статистика; если каталог уже вытеснен, файл загружается заново."""
+    cache_path, all_season_stats = get_dataset_stats(digest, file_upload)
+    if not os.path.exists(cache_path):
+        forget_cache_path(digest, cache_path)
+        cache_path, all_season_stats = get_dataset_stats(digest, file_upload)
+    return cache_path, all_season_stats
+
 
 def main():
     # Настройка страницы
@@ -20,16 +82,14 @@ def main():
     # Проверка наличия файла
     if file_upload is not None:
         try:
-            # Попытка загрузить данные
-            data = pd.read_csv(file_upload)
-
-            # Проверка на наличие необходимых колонок
-            required_columns = {'city', 'timestamp', 'temperature', 'season'}
-            if not required_columns.issubset(data.columns):
-                st.error(f'Файл должен содержать следующие колонки: {", ".join(required_columns)}')
-                return
-            else:
-                st.success("Данные успешно загружены!")
+            # Потоковая загрузка в колоночный кэш по хэшу содержимого: при повторной
+            # загрузке того же файла CSV не разбирается, статистика читается готовой
+            digest = get_file_hash(file_upload.file_id, file_upload)
+            cache_path, all_season_stats = get_cached_dataset(digest, file_upload)
+            st.success("Данные успешно загружены!")
+        except MissingColumnsError as e:
+            st.error(str(e))
+            return
         except Exception as e:
             st.error(f"Ошибка при чтении файла: {e}")
             return
@@ -37,24 +97,25 @@ def main():
         st.info("Пожалуйста, загрузите CSV-файл с историческими данными.")
         return
 
-    # Преобразование данных
-    data['timestamp'] = pd.to_datetime(data['timestamp'])  # Преобразуем timestamp в datetime
-
     # Выбор города
-    cities = data['city'].unique()
+    cities = all_season_stats.index.unique(level='city')
     selected_city = st.selectbox("Выберите город для анализа", cities)
-    city_data = data[data['city'] == selected_city]
 
     # Ввод API ключа
     api_key = st.text_input('Введите API ключ OpenWeatherMap для текущей температуры')
 
     # Расчёт статистики
     st.subheader(f'Статистика по городу: {selected_city}')
-    season_stats = city_data.groupby('season')['temperature'].agg(['mean', 'std'])
+    season_stats = all_season_stats.loc[selected_city]
     st.dataframe(season_stats)
 
-    # Добавление аномалий
-    city_data = detect_anomalies(city_data, season_stats)
+    # Добавление аномалий; в память загружается только раздел выбранного города
+    try:
+        city_data = get_city_analysis(cache_path, selected_city, season_stats)
+    except FileNotFoundError:
+        # Каталог вытеснен после проверки (кэш чистит загрузка другого файла): загружаем заново
+        forget_cache_path(digest, cache_path)
+        st.rerun()
 
     # Визуализация временных рядов с точками
     st.subheader(f'Временные ряды температуры для города: {selected_city}')
@@ -0,0 +1,80 @@
+"""
+Сравнение поиска аномалий: цикл по сезонам для каждого города против
+векторного прохода по всем городам (detect_anomalies_all).
+
+    python benchmark_anomalies.py --years 10 --copies 10 --repeat 5
+
+Без --data набор генерируется generate_data.py; --copies увеличивает число городов.
+"""
+import argparse
+import statistics
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from generate_data import generate_realistic_temperature_data
+from temperature_analysis import detect_anomalies_all
+
+
+def detect_anomalies_loop(city_data, season_stats):
+    """Прежняя реализация: маскированное присваивание .loc для каждого сезона."""
+    city_data = city_data.copy()
+    city_data['is_anomaly'] = False
+    for season, stats in season_stats.iterrows():
+        lower_bound = stats['mean'] - 2 * stats['std']
+        upper_bound = stats['mean'] + 2 * stats['std']
+        is_season = city_data['season'] == season
+        city_data.loc[is_season, 'is_anomaly'] = ~city_data[is_season]['temperature'].between(lower_bound, upper_bound)
+    city_data['rolling_mean'] = city_data['temperature'].rolling(window=30, center=True).mean()
+    return city_data
+
+
+def analyze_loop(data):
+    """Все города по одному, как раньше делало приложение для выбранного города."""
+    results = []
+    for city in data['city'].unique():
+        city_data = data[data['city'] == city]
+        season_stats = city_data.groupby('season')['temperature'].agg(['mean', 'std'])
+        results.append(detect_anomalies_loop(city_data, season_stats))
+    return pd.concat(results)
+
+
+def measure(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func(data)
+        timings.append(perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Скорость поиска аномалий")
+    parser.add_argument("--data", help="CSV с историческими данными")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--copies", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.data:
+        data = pd.read_csv(args.data, parse_dates=['timestamp'])
+    else:
+        data = generate_realistic_temperature_data(args.years, args.copies, seed=42)
+    print(f"строк: {len(data)}, городов: {data['city'].nunique()}")
+
+    # Результаты обеих реализаций должны совпадать
+    expected = analyze_loop(data).sort_index()
+    actual = detect_anomalies_all(data)[0].sort_index()
+    assert (expected['is_anomaly'] == actual['is_anomaly']).all()
+    assert np.allclose(expected['rolling_mean'], actual['rolling_mean'], equal_nan=True)
+
+    loop_time = measure(analyze_loop, data, args.repeat)
+    vectorized_time = measure(detect_anomalies_all, data, args.repeat)
+    print(f"цикл по городам и сезонам: {loop_time * 1000:9.1f} мс")
+    print(f"detect_anomalies_all:      {vectorized_time * 1000:9.1f} мс")
+    print(f"ускорение: x{loop_time / vectorized_time:.1f}")
+
+
+if __name__ == "__main__":
+    main()
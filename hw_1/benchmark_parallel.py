@@ -0,0 +1,65 @@
+"""
+Масштабирование параллельного анализа (analyze_parallel) от 1 до N процессов.
+
+    python benchmark_parallel.py --copies 20 --max-workers 8
+
+Пул создается заранее для каждого числа процессов, поэтому в замер входит
+только анализ: раздача данных через shared memory и сбор результатов.
+Для сравнения выводится однопроцессный detect_anomalies_all.
+"""
+import argparse
+import os
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from generate_data import generate_realistic_temperature_data
+from parallel_analysis import analyze_parallel
+from temperature_analysis import detect_anomalies_all
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Масштабирование параллельного анализа")
+    parser.add_argument("--data", help="CSV с историческими данными")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.data:
+        data = pd.read_csv(args.data, parse_dates=['timestamp'])
+    else:
+        data = generate_realistic_temperature_data(args.years, args.copies, seed=42)
+    print(f"строк: {len(data)}, городов: {data['city'].nunique()}")
+
+    expected, expected_stats = detect_anomalies_all(data)
+    baseline = measure(lambda: detect_anomalies_all(data), args.repeat)
+    print(f"detect_anomalies_all (1 процесс): {baseline * 1000:9.1f} мс")
+
+    single = None
+    for workers in range(1, args.max_workers + 1):
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            result, season_stats = analyze_parallel(data, executor=executor)  # прогрев пула и проверка
+            assert (result['is_anomaly'] == expected['is_anomaly']).all()
+            assert np.allclose(result['rolling_mean'], expected['rolling_mean'], equal_nan=True)
+            assert np.allclose(season_stats.sort_index(), expected_stats.sort_index(), equal_nan=True)
+            elapsed = measure(lambda: analyze_parallel(data, executor=executor), args.repeat)
+        single = single or elapsed
+        print(f"analyze_parallel, процессов {workers:>2}: {elapsed * 1000:9.1f} мс  ускорение x{single / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Генерация синтетических исторических данных о температуре (как в условии задания).
+
+    python generate_data.py --years 10 --output data/temperature_data.csv
+
+Для замеров на больших объемах --copies N повторяет набор городов N раз
+с суффиксом в названии (Moscow_1, Moscow_2, ...).
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+# Средняя температура по сезонам для каждого города
+seasonal_temperatures = {
+    "New York": {"winter": 0, "spring": 10, "summer": 25, "autumn": 15},
+    "London": {"winter": 5, "spring": 11, "summer": 18, "autumn": 12},
+    "Paris": {"winter": 4, "spring": 12, "summer": 20, "autumn": 13},
+    "Tokyo": {"winter": 6, "spring": 15, "summer": 27, "autumn": 18},
+    "Moscow": {"winter": -10, "spring": 5, "summer": 18, "autumn": 8},
+    "Sydney": {"winter": 12, "spring": 18, "summer": 25, "autumn": 20},
+    "Berlin": {"winter": 0, "spring": 10, "summer": 20, "autumn": 11},
+    "Beijing": {"winter": -2, "spring": 13, "summer": 27, "autumn": 16},
+    "Rio de Janeiro": {"winter": 20, "spring": 25, "summer": 30, "autumn": 25},
+    "Dubai": {"winter": 20, "spring": 30, "summer": 40, "autumn": 30},
+    "Los Angeles": {"winter": 15, "spring": 18, "summer": 25, "autumn": 20},
+    "Singapore": {"winter": 27, "spring": 28, "summer": 28, "autumn": 27},
+    "Mumbai": {"winter": 25, "spring": 30, "summer": 35, "autumn": 30},
+    "Cairo": {"winter": 15, "spring": 25, "summer": 35, "autumn": 25},
+    "Mexico City": {"winter": 12, "spring": 18, "summer": 20, "autumn": 15},
+}
+
+# Сопоставление месяцев с сезонами
+month_to_season = {
+    12: "winter", 1: "winter", 2: "winter",
+    3: "spring", 4: "spring", 5: "spring",
+    6: "summer", 7: "summer", 8: "summer",
+    9: "autumn", 10: "autumn", 11: "autumn",
+}
+
+
+def generate_realistic_temperature_data(num_years=10, copies=1, seed=None):
+    """
+    Генерирует ежедневную температуру для всех городов за num_years лет.
+
+    Возвращает:
+    - DataFrame с колонками city, timestamp, temperature, season.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start="2010-01-01", periods=365 * num_years, freq="D")
+    seasons = dates.month.map(month_to_season).to_numpy()
+
+    frames = []
+    for copy in range(copies):
+        for city, temperatures in seasonal_temperatures.items():
+            mean_temp = np.array([temperatures[season] for season in seasons], dtype=float)
+            frames.append(pd.DataFrame({
+                "city": city if copies == 1 else f"{city}_{copy + 1}",
+                "timestamp": dates,
+                "temperature": rng.normal(loc=mean_temp, scale=5),
+                "season": seasons,
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация исторических данных о температуре")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--copies", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="data/temperature_data.csv")
+    args = parser.parse_args()
+
+    data = generate_realistic_temperature_data(args.years, args.copies, args.seed)
+    data.to_csv(args.output, index=False)
+    print(f"{len(data)} строк записано в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Потоковая загрузка CSV с историческими данными и колоночный кэш на диске.
+
+Файл читается кусками фиксированного размера с явными типами (city и season -
+категории, temperature - float32, timestamp разбирается при чтении). Каждый
+кусок дописывается в Parquet-датасет, разбитый по городам, и обновляет
+сезонную статистику, после чего освобождается, поэтому пиковая память
+определяется размером куска, а не файла.
+
+Кэш лежит в TEMPERATURE_CACHE_DIR/<sha256 содержимого>/: data/city=<город>/
+с данными и season_stats.parquet. Повторная загрузка того же файла не
+разбирает CSV заново, а город читается из своего раздела через mmap.
+После записи нового файла кэш чистится: удаляются записи, не использованные
+дольше TEMPERATURE_CACHE_MAX_AGE секунд, затем самые давние сверх
+TEMPERATURE_CACHE_MAX_BYTES, и каталоги building-*, брошенные после сбоя.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+REQUIRED_COLUMNS = {'city', 'timestamp', 'temperature', 'season'}
+CSV_DTYPES = {'city': 'category', 'season': 'category', 'temperature': 'float32'}
+CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', '200000'))
+CACHE_DIR = os.getenv('TEMPERATURE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'temperature_cache'))
+CACHE_MAX_BYTES = int(os.getenv('TEMPERATURE_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+CACHE_MAX_AGE = float(os.getenv('TEMPERATURE_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+
+DATA_DIR = 'data'
+SEASON_STATS_FILE = 'season_stats.parquet'
+HASH_BLOCK_SIZE = 1024 * 1024
+BUILDING_PREFIX = 'building-'
+# Сборка столько не длится: такой каталог остался от упавшего процесса
+BUILDING_MAX_AGE = 24 * 3600
+
+# Схема кэша фиксирована: категории разных кусков различаются, а датасет должен быть единым
+CACHE_SCHEMA = pa.schema([
+    ('city', pa.string()),
+    ('timestamp', pa.timestamp('ns')),
+    ('temperature', pa.float32()),
+    ('season', pa.dictionary(pa.int32(), pa.string())),
+])
+
+
+class MissingColumnsError(ValueError):
+    pass
+
+
+class SeasonStatsAccumulator:
+    """
+    Сезонная статистика (city, season), накапливаемая по кускам данных.
+
+    Для каждой группы хранятся count, mean и m2 (сумма квадратов отклонений,
+    алгоритм Уэлфорда). Два накопителя объединяются формулой Чана, поэтому
+    куски можно обрабатывать по очереди или независимо и сливать результаты.
+    """
+
+    def __init__(self):
+        self.state = pd.DataFrame(
+            {'count': pd.Series(dtype='int64'), 'mean': pd.Series(dtype='float64'), 'm2': pd.Series(dtype='float64')},
+            index=pd.MultiIndex.from_arrays([[], []], names=['city', 'season']),
+        )
+
+    def update(self, chunk):
+        """Добавляет кусок данных: статистика куска считается одним groupby и сливается с накопленной."""
+        temperature = chunk['temperature'].astype('float64')
+        groups = temperature.groupby([chunk['city'], chunk['season']], observed=True)
+        part = pd.DataFrame({'count': groups.count(), 'mean': groups.mean()})
+        part['m2'] = groups.var(ddof=0).fillna(0.0) * part['count']
+        # Категории разных кусков различаются: приводим индекс к обычным строкам
+        part.index = pd.MultiIndex.from_arrays(
+            [part.index.get_level_values(0).astype(str), part.index.get_level_values(1).astype(str)],
+            names=['city', 'season'],
+        )
+        self._merge_state(part)
+
+    def merge(self, other):
+        """Объединяет с другим накопителем (например, посчитанным в другом процессе)."""
+        self._merge_state(other.state)
+        return self
+
+    def _merge_state(self, other):
+        left, right = self.state.align(other, join='outer', fill_value=0)
+        count = left['count'] + right['count']
+        delta = right['mean'] - left['mean']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = left['mean'] + delta * right['count'] / count
+            m2 = left['m2'] + right['m2'] + delta ** 2 * left['count'] * right['count'] / count
+        self.state = pd.DataFrame({'count': count.astype('int64'), 'mean': mean, 'm2': m2}).sort_index()
+
+    def result(self):
+        """DataFrame с индексом (city, season) и колонками mean, std (ddof=1, как в pandas)."""
+        count = self.state['count']
+        std = np.sqrt(self.state['m2'] / (count - 1)).where(count > 1)
+        return pd.DataFrame({'mean': self.state['mean'], 'std': std})
+
+
+def read_csv_chunks(source, chunksize=CHUNK_SIZE):
+    """
+    Итератор по кускам CSV с явными типами колонок.
+
+    Аргументы:
+    - source: путь к файлу или файловый объект (например, загруженный в Streamlit).
+    - chunksize: число строк в куске.
+    """
+    header = pd.read_csv(source, nrows=0)
+    if not REQUIRED_COLUMNS.issubset(header.columns):
+        raise MissingColumnsError(f'Файл должен содержать следующие колонки: {", ".join(REQUIRED_COLUMNS)}')
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_csv(
+        source,
+        usecols=list(CACHE_SCHEMA.names),
+        dtype=CSV_DTYPES,
+        parse_dates=['timestamp'],
+        chunksize=chunksize,
+    )
+
+
+def file_hash(source):
+    """sha256 содержимого файла (путь или файловый объект), читается блоками."""
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+    else:
+        source.seek(0)
+        for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+        source.seek(0)
+    return digest.hexdigest()
+
+
+def ingest_csv(source, cache_path, chunksize=CHUNK_SIZE):
+    """
+    Читает CSV по кускам, записывает колоночный кэш и считает сезонную статистику.
+
+    Аргументы:
+    - source: путь к CSV или файловый объект.
+    - cache_path: каталог кэша (data/city=<город>/ и season_stats.parquet).
+    - chunksize: число строк в куске.
+
+    Возвращает:
+    - DataFrame сезонной статистики с индексом (city, season).
+    """
+    stats = SeasonStatsAccumulator()
+
+    def batches():
+        for chunk in read_csv_chunks(source, chunksize):
+            stats.update(chunk)
+            yield from pa.Table.from_pandas(chunk[CACHE_SCHEMA.names], schema=CACHE_SCHEMA, preserve_index=False).to_batches()
+
+    ds.write_dataset(
+        batches(), os.path.join(cache_path, DATA_DIR), schema=CACHE_SCHEMA, format='parquet',
+        partitioning=ds.partitioning(pa.schema([('city', pa.string())]), flavor='hive'),
+        # Скользящее среднее зависит от порядка строк внутри города
+        preserve_order=True,
+    )
+    season_stats = stats.result()
+    season_stats.to_parquet(os.path.join(cache_path, SEASON_STATS_FILE))
+    return season_stats
+
+
+def load_dataset(source, cache_dir=CACHE_DIR, chunksize=CHUNK_SIZE, digest=None):
+    """
+    Возвращает кэш файла, при необходимости создавая его.
+
+    Ключ кэша - хэш содержимого, поэтому перезапуск приложения или повторная
+    загрузка того же файла обходятся без разбора CSV. Уже посчитанный хэш
+    можно передать в digest.
+
+    Возвращает:
+    - (каталог кэша, DataFrame сезонной статистики).
+    """
+    cache_path = os.path.join(cache_dir, digest or file_hash(source))
+    stats_path = os.path.join(cache_path, SEASON_STATS_FILE)
+    if os.path.exists(stats_path):
+        # Время изменения каталога - время последнего использования для evict_cache
+        os.utime(cache_path)
+        return cache_path, pd.read_parquet(stats_path)
+
+    # Датасет собирается во временном каталоге и появляется под своим именем целиком
+    os.makedirs(cache_dir, exist_ok=True)
+    building_path = tempfile.mkdtemp(prefix=BUILDING_PREFIX, dir=cache_dir)
+    try:
+        season_stats = ingest_csv(source, building_path, chunksize)
+        os.replace(building_path, cache_path)
+    except OSError:
+        # Тот же файл уже закэширован параллельным запуском
+        if not os.path.exists(stats_path):
+            raise
+    finally:
+        shutil.rmtree(building_path, ignore_errors=True)
+    evict_cache(cache_dir, keep=cache_path)
+    return cache_path, season_stats
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def evict_cache(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE, keep=None):
+    """
+    Удаляет из кэша записи, не использованные дольше max_age секунд, и затем
+    самые давние, пока размер кэша больше max_bytes; запись keep остается.
+    Заодно удаляются каталоги building-* старше BUILDING_MAX_AGE.
+
+    Возвращает:
+    - число удаленных записей.
+    """
+    now = time.time()
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            mtime = entry.stat().st_mtime
+            if entry.name.startswith(BUILDING_PREFIX):
+                if now - mtime > BUILDING_MAX_AGE:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            entries.append((mtime, entry.path, _dir_size(entry.path)))
+
+    total = sum(size for _, _, size in entries)
+    evicted = 0
+    for mtime, path, size in sorted(entries):
+        if path == keep or (now - mtime <= max_age and total <= max_bytes):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+
+def open_dataset(cache_path):
+    """Датасет кэша; файлы разделов отображаются в память."""
+    return ds.dataset(
+        os.path.join(cache_path, DATA_DIR), format='parquet',
+        # Тип раздела задан явно: иначе города из цифр выводятся как int32
+        partitioning=ds.partitioning(pa.schema([('city', pa.string())]), flavor='hive'),
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+    )
+
+
+def load_city(dataset, city):
+    """Загружает из датасета (open_dataset) только раздел одного города."""
+    return load_all(dataset, filter=ds.field('city') == city)
+
+
+def load_all(dataset, filter=None):
+    """Загружает датасет целиком (или по фильтру); порядок строк внутри города сохраняется."""
+    data = dataset.to_table(columns=CACHE_SCHEMA.names, filter=filter).to_pandas()
+    data['season'] = data['season'].astype(str)
+    return data
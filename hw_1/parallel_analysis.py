@@ -0,0 +1,165 @@
+"""
+Параллельный поиск аномалий по городам в пуле процессов.
+
+Данные не передаются воркерам через pickle: температура и коды сезонов,
+отсортированные по городу, лежат в блоках shared memory, а воркер получает
+только имена блоков и границы своего города и читает их как массивы NumPy
+без копирования. Результаты (is_anomaly, rolling_mean) воркеры пишут в
+общие выходные блоки, обратно возвращается только сезонная статистика.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+ROLLING_WINDOW = 30
+
+
+def default_workers():
+    return int(os.getenv("ANALYSIS_WORKERS", os.cpu_count() or 1))
+
+
+def _attach(name):
+    # Воркеры пула используют resource_tracker родителя, и повторная регистрация
+    # блока при подключении ничего не меняет; в 3.13+ ее можно отключить явно
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedArrays:
+    """Набор массивов NumPy в блоках shared memory; описание передается воркерам."""
+
+    def __init__(self):
+        self._blocks = []
+        self.spec = {}
+
+    def create(self, key, length, dtype):
+        dtype = np.dtype(dtype)
+        shm = shared_memory.SharedMemory(create=True, size=max(length * dtype.itemsize, 1))
+        self._blocks.append(shm)
+        self.spec[key] = (shm.name, length, dtype.str)
+        return np.ndarray(length, dtype=dtype, buffer=shm.buf)
+
+    def close(self):
+        for shm in self._blocks:
+            shm.close()
+            shm.unlink()
+        self._blocks.clear()
+
+
+def _season_bounds(temperature, seasons, n_seasons):
+    """Среднее и отклонение (ddof=1, как в pandas) по кодам сезонов без цикла; код -1 (нет сезона) пропускается."""
+    known = seasons >= 0
+    temperature, seasons = temperature[known], seasons[known]
+    counts = np.bincount(seasons, minlength=n_seasons)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.bincount(seasons, weights=temperature, minlength=n_seasons) / counts
+        deviation = temperature - mean[seasons]
+        std = np.sqrt(np.bincount(seasons, weights=deviation * deviation, minlength=n_seasons) / (counts - 1))
+    std[counts < 2] = np.nan
+    return counts, mean, std
+
+
+def _analyze_city(spec, n_seasons, start, stop):
+    """Воркер: анализ одного города по представлениям общих массивов."""
+    blocks = {key: _attach(name) for key, (name, _, _) in spec.items()}
+    try:
+        arrays = {
+            key: np.ndarray(length, dtype=np.dtype(dtype), buffer=blocks[key].buf)[start:stop]
+            for key, (_, length, dtype) in spec.items()
+        }
+        temperature = arrays["temperature"]
+        seasons = arrays["season"]
+
+        counts, mean, std = _season_bounds(temperature, seasons, n_seasons)
+        # Строке без сезона (код -1) достается добавленная в конец пустая граница,
+        # аномалией она не считается, как в detect_anomalies_all
+        mean_temp = np.append(mean, np.nan)[seasons]
+        std_temp = np.append(std, np.nan)[seasons]
+        arrays["is_anomaly"][:] = (seasons >= 0) & ~(
+            (temperature >= mean_temp - 2 * std_temp) & (temperature <= mean_temp + 2 * std_temp)
+        )
+        arrays["rolling_mean"][:] = pd.Series(temperature, copy=False).rolling(
+            window=ROLLING_WINDOW, center=True
+        ).mean().to_numpy()
+        present = np.flatnonzero(counts)
+        return present, mean[present], std[present]
+    finally:
+        # Представления должны быть освобождены до закрытия блоков
+        arrays = temperature = seasons = None
+        for shm in blocks.values():
+            shm.close()
+
+
+def analyze_parallel(data, workers=None, executor=None):
+    """
+    Определяет аномалии для всех городов в пуле процессов.
+
+    Аргументы:
+    - data: DataFrame с данными о температуре по всем городам.
+    - workers: число процессов (по умолчанию ANALYSIS_WORKERS или число ядер).
+    - executor: готовый ProcessPoolExecutor, чтобы не создавать пул на каждый вызов.
+
+    Возвращает:
+    - (DataFrame с колонками `is_anomaly` и `rolling_mean`, сезонная статистика),
+      как detect_anomalies_all.
+    """
+    # Пропуск города или сезона factorize кодирует как -1
+    city_codes, cities = pd.factorize(data['city'], sort=True)
+    season_codes, seasons = pd.factorize(data['season'], sort=True)
+    # Стабильная сортировка по городу: внутри города сохраняется исходный порядок строк.
+    # Строки без города оказываются в начале, до bounds[0], и воркерам не раздаются
+    order = np.argsort(city_codes, kind="stable")
+    bounds = np.searchsorted(city_codes[order], np.arange(len(cities) + 1))
+
+    shared = SharedArrays()
+    try:
+        shared.create("temperature", len(data), np.float64)[:] = data['temperature'].to_numpy(dtype=np.float64)[order]
+        shared.create("season", len(data), np.int32)[:] = season_codes[order]
+        is_anomaly = shared.create("is_anomaly", len(data), np.bool_)
+        rolling_mean = shared.create("rolling_mean", len(data), np.float64)
+        # Строки без города: не аномалии и без скользящего среднего
+        is_anomaly[:bounds[0]] = False
+        rolling_mean[:bounds[0]] = np.nan
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=workers or default_workers())
+        try:
+            futures = [
+                executor.submit(_analyze_city, shared.spec, len(seasons), bounds[i], bounds[i + 1])
+                for i in range(len(cities))
+            ]
+            stats = [future.result() for future in futures]
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+        result = data.copy()
+        # Возвращаем строки в исходный порядок
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        result['is_anomaly'] = is_anomaly[inverse]
+        result['rolling_mean'] = rolling_mean[inverse]
+    finally:
+        is_anomaly = rolling_mean = None
+        shared.close()
+
+    season_stats = pd.DataFrame(
+        {
+            'mean': np.concatenate([mean for _, mean, _ in stats]),
+            'std': np.concatenate([std for _, _, std in stats]),
+        },
+        index=pd.MultiIndex.from_arrays(
+            [
+                np.repeat(cities, [len(present) for present, _, _ in stats]),
+                seasons[np.concatenate([present for present, _, _ in stats])],
+            ],
+            names=['city', 'season'],
+        ),
+    )
+    return result, season_stats
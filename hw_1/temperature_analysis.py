@@ -1,7 +1,47 @@
 from api import fetch_temperature
+import numpy as np
 import streamlit as st
 
 
+def detect_anomalies_all(data):
+    """
+    Определяет аномалии сразу для всех городов.
+
+    Среднее и отклонение считаются одним groupby по (city, season), границы
+    раздаются строкам по номеру группы, а сравнение выполняется одним
+    векторным проходом NumPy по всему набору данных.
+
+    Аргументы:
+    - data: DataFrame с данными о температуре по всем городам.
+
+    Возвращает:
+    - (DataFrame с колонками `is_anomaly` и `rolling_mean`, сезонная статистика).
+    """
+    data = data.copy()
+    groups = data.groupby(['city', 'season'], observed=True)
+    season_stats = groups['temperature'].agg(['mean', 'std'])
+
+    # Номер группы каждой строки совпадает с позицией группы в season_stats;
+    # строки без города или сезона не входят ни в одну группу (ngroup = NaN),
+    # им достается номер -1 и добавленная в конец пустая граница
+    codes = groups.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    grouped = codes >= 0
+    mean_temp = np.append(season_stats['mean'].to_numpy(), np.nan)[codes]
+    std_temp = np.append(season_stats['std'].to_numpy(), np.nan)[codes]
+    temperature = data['temperature'].to_numpy()
+    # Как и Series.between: строка без границ (std = NaN) считается аномалией;
+    # строки без группы сравнивать не с чем, они аномалиями не считаются
+    data['is_anomaly'] = grouped & ~((temperature >= mean_temp - 2 * std_temp) & (temperature <= mean_temp + 2 * std_temp))
+
+    # Скользящее среднее по каждому городу отдельно
+    data['rolling_mean'] = (
+        data.groupby('city', observed=True, sort=False)['temperature']
+        .rolling(window=30, center=True).mean()
+        .reset_index(level=0, drop=True)
+    )
+    return data, season_stats
+
+
 def detect_anomalies(city_data, season_stats):
     """
     Определяет аномалии в данных по температуре.
@@ -14,16 +54,12 @@ def detect_anomalies(city_data, season_stats):
     - DataFrame с добавленной колонкой `is_anomaly`.
     """
     city_data = city_data.copy()
-    city_data['is_anomaly'] = False  # Изначально помечаем все как нормальные
-    for season, stats in season_stats.iterrows():
-        mean_temp = stats['mean']
-        std_temp = stats['std']
-        lower_bound = mean_temp - 2 * std_temp
-        upper_bound = mean_temp + 2 * std_temp
-
-        # Помечаем аномалии
-        is_season = city_data['season'] == season
-        city_data.loc[is_season, 'is_anomaly'] = ~city_data[is_season]['temperature'].between(lower_bound, upper_bound)
+    # Границы сезона для каждой строки без цикла по сезонам
+    bounds = season_stats.reindex(city_data['season'])
+    mean_temp = bounds['mean'].to_numpy()
+    std_temp = bounds['std'].to_numpy()
+    temperature = city_data['temperature'].to_numpy()
+    city_data['is_anomaly'] = ~((temperature >= mean_temp - 2 * std_temp) & (temperature <= mean_temp + 2 * std_temp))
 
     # Добавляем скользящее среднее
     city_data['rolling_mean'] = city_data['temperature'].rolling(window=30, center=True).mean()
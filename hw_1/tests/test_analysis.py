@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from parallel_analysis import analyze_parallel
+from temperature_analysis import detect_anomalies_all
+
+
+def make_data():
+    # 40 дней на город, один выброс и строки без города или сезона
+    timestamp = pd.date_range('2020-01-01', periods=40)
+    frames = []
+    for city in ['Berlin', 'Moscow']:
+        temperature = np.linspace(-5.0, 5.0, len(timestamp))
+        frames.append(pd.DataFrame({'city': city, 'timestamp': timestamp, 'temperature': temperature, 'season': 'winter'}))
+    data = pd.concat(frames, ignore_index=True)
+    data.loc[5, 'temperature'] = 60.0
+    data.loc[10, 'season'] = np.nan
+    data.loc[50, 'city'] = np.nan
+    return data
+
+
+def test_detect_anomalies_all_skips_rows_without_group():
+    result, season_stats = detect_anomalies_all(make_data())
+    assert list(season_stats.index) == [('Berlin', 'winter'), ('Moscow', 'winter')]
+    assert result['is_anomaly'].dtype == bool
+    assert not result.loc[[10, 50], 'is_anomaly'].any()
+    assert result['is_anomaly'].sum() == 1 and result.loc[5, 'is_anomaly']
+
+
+def test_analyze_parallel_matches_detect_anomalies_all_with_missing_keys():
+    data = make_data()
+    expected, expected_stats = detect_anomalies_all(data)
+    result, season_stats = analyze_parallel(data, workers=2)
+    assert (result['is_anomaly'] == expected['is_anomaly']).all()
+    assert np.allclose(result['rolling_mean'], expected['rolling_mean'], equal_nan=True)
+    assert np.allclose(season_stats.sort_index(), expected_stats.sort_index(), equal_nan=True)
@@ -0,0 +1,83 @@
+"""
+Окружение микробенчмарков: SQLite и fakeredis вместо PostgreSQL и Redis.
+
+Для замеров на настоящих сервисах задайте DATABASE_URL (схема создается
+миграциями) и REDIS_URL - тогда подмены не выполняются.
+"""
+import os
+import statistics
+import tempfile
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix="shortener-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_dir}/bench.db")
+# Стоимость bcrypt не относится к замеряемым операциям
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# Фоновые задачи не должны конкурировать с замерами
+os.environ.setdefault("REAPER_ENABLED", "0")
+_USE_FAKE_REDIS = "REDIS_URL" not in os.environ
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentiles(data: list[float]) -> dict:
+    q = statistics.quantiles(data, n=100) if len(data) > 1 else list(data) * 99
+    return {f"p{p}": q[p - 1] for p in PERCENTILES}
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from url_shortener.app.db.models import Base
+    from url_shortener.app.db.session import engine
+    from url_shortener.app.db import redis_pool
+    from url_shortener.app.main import app
+
+    if os.environ["DATABASE_URL"].startswith("sqlite"):
+        Base.metadata.create_all(engine)
+    if _USE_FAKE_REDIS:
+        fakeredis = pytest.importorskip("fakeredis")
+        fake = fakeredis.FakeAsyncRedis()
+        redis_pool._client = fake
+        redis_pool._pool = fake.connection_pool
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    credentials = {"email": "bench@example.com", "password": "bench-password"}
+    client.post("/auth/register", json=credentials)
+    token = client.post("/auth/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="session")
+def short_code(client, auth_headers):
+    response = client.post("/links/shorten", json={"original_url": "https://example.com/bench"}, headers=auth_headers)
+    return response.json()["short_code"]
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    # В JSON (--benchmark-json/--benchmark-autosave) добавляем перцентили и RPS для сравнения между коммитами
+    by_name = {bench.fullname: bench for bench in benchmarks}
+    for entry in output_json["benchmarks"]:
+        bench = by_name.get(entry["fullname"])
+        if bench is None or not bench.stats.data:
+            continue
+        entry["stats"].update(percentiles(bench.stats.data))
+        entry["stats"]["rps"] = 1 / statistics.fmean(bench.stats.data)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    session = getattr(config, "_benchmarksession", None)
+    benchmarks = [bench for bench in getattr(session, "benchmarks", []) if bench.stats and bench.stats.data]
+    if not benchmarks:
+        return
+    terminalreporter.section("latency percentiles")
+    for bench in benchmarks:
+        p = percentiles(bench.stats.data)
+        terminalreporter.write_line(
+            f"{bench.name:<40} p50={p['p50'] * 1000:8.3f} ms  p95={p['p95'] * 1000:8.3f} ms  "
+            f"p99={p['p99'] * 1000:8.3f} ms  rps={1 / statistics.fmean(bench.stats.data):10.1f}"
+        )
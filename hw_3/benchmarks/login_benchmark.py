@@ -0,0 +1,75 @@
+"""
+Бенчмарк пропускной способности логина (проверки пароля bcrypt).
+
+Запускает N одновременных проверок пароля через пул потоков (как было
+раньше, run_in_threadpool) и через пул процессов PasswordHasher, печатает
+логины в секунду и задержку event loop во время нагрузки.
+
+    BCRYPT_ROUNDS=12 PASSWORD_HASH_WORKERS=4 \
+        python -m benchmarks.login_benchmark --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from starlette.concurrency import run_in_threadpool
+from url_shortener.app.core.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+from url_shortener.app.utils.password_hasher import PasswordHasher
+from url_shortener.app.utils.security import get_password_hash, verify_password
+
+
+async def loop_lag(stop: asyncio.Event, interval: float = 0.01) -> list[float]:
+    # Насколько позже запланированного просыпается корутина: мера занятости loop
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - started - interval) * 1000)
+    return lags
+
+
+async def run(label: str, verify, hashed: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            assert await verify("password", hashed)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = await lag_task
+    q = statistics.quantiles(lags, n=100) if len(lags) > 1 else [0.0] * 99
+    print(f"{label:<14} {logins / elapsed:8.1f} logins/s  loop lag p50={q[49]:6.2f} ms  p99={q[98]:6.2f} ms")
+
+
+async def main_async(logins: int, concurrency: int, workers: int):
+    hashed = get_password_hash("password")
+    print(f"bcrypt rounds={BCRYPT_ROUNDS}, process workers={workers}, logins={logins}, concurrency={concurrency}")
+    await run("threadpool", lambda p, h: run_in_threadpool(verify_password, p, h), hashed, logins, concurrency)
+
+    hasher = PasswordHasher(workers, max(PASSWORD_HASH_MAX_QUEUE, logins))
+    hasher.start()
+    try:
+        # Первые задачи поднимают процессы пула, в замер это не включаем
+        await asyncio.gather(*(hasher.verify("password", hashed) for _ in range(workers)))
+        await run("process pool", hasher.verify, hashed, logins, concurrency)
+        print(hasher.stats())
+    finally:
+        hasher.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк проверки паролей bcrypt")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.logins, args.concurrency, args.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Накладные расходы маршрута редиректа при попадании в кэш.
+
+Сравнивает текущий маршрут Starlette (main.redirect) с прежним маршрутом
+FastAPI (Depends(get_redis), валидация параметра, RedirectResponse).
+Оба приложения вызываются напрямую как ASGI без сети и middleware, ссылка
+лежит в L1, переходы пишутся в fakeredis - разница в замере приходится на
+обработку запроса фреймворком.
+
+    python -m benchmarks.redirect_benchmark --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import fakeredis
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import RedirectResponse
+from starlette.routing import Route
+from url_shortener.app import main
+from url_shortener.app.api.dependencies import get_redis
+from url_shortener.app.db import redis_pool
+from url_shortener.app.utils.link_cache import MISSING, get_cached_url, l1_cache
+
+SHORT_CODE = "bench1"
+
+
+def legacy_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str, request: Request, redis = Depends(get_redis)):
+        cached_url = await get_cached_url(redis, short_code)
+        if cached_url == MISSING:
+            raise HTTPException(status_code=404, detail="Link not found")
+        await main._record_click(redis, short_code, request)
+        return RedirectResponse(url=cached_url)
+
+    return app
+
+
+def fast_app() -> FastAPI:
+    app = FastAPI()
+    app.router.routes.append(Route("/{short_code}", main.redirect, methods=["GET"]))
+    return app
+
+
+async def measure(app, requests: int) -> list[float]:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": f"/{SHORT_CODE}", "raw_path": f"/{SHORT_CODE}".encode(),
+        "root_path": "", "query_string": b"", "server": ("bench", 80), "client": ("127.0.0.1", 1),
+        "headers": [(b"host", b"bench"), (b"user-agent", b"bench")],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 307
+
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await app(dict(scope), receive, send)
+        timings.append((time.perf_counter() - started) * 1_000_000)
+    return timings
+
+
+def report(label: str, timings: list[float]):
+    q = statistics.quantiles(timings, n=100)
+    print(f"{label:<22} p50={q[49]:7.1f} us  p95={q[94]:7.1f} us  p99={q[98]:7.1f} us  "
+          f"rps={1_000_000 / statistics.fmean(timings):9.0f}")
+
+
+async def main_async(requests: int):
+    fake = fakeredis.FakeAsyncRedis()
+    redis_pool._client = fake
+    redis_pool._pool = fake.connection_pool
+    l1_cache.set(SHORT_CODE, "https://example.com/bench", ttl=3600)
+    apps = {"FastAPI + Depends": legacy_app(), "Starlette fast path": fast_app()}
+    for app in apps.values():
+        await measure(app, requests // 10)  # прогрев
+    results = {label: await measure(app, requests) for label, app in apps.items()}
+    for label, timings in results.items():
+        report(label, timings)
+    saved = statistics.median(results["FastAPI + Depends"]) - statistics.median(results["Starlette fast path"])
+    print(f"saved per request (p50): {saved:.1f} us")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Накладные расходы маршрута редиректа")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args.requests))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,47 @@
+"""
+Микробенчмарки горячих путей: редирект, создание ссылки, генерация кода.
+
+    python -m pytest benchmarks --benchmark-autosave
+    pytest-benchmark compare --columns=min,median,mean,ops
+
+Результаты сохраняются в .benchmarks/ вместе с коммитом и дополняются
+p50/p95/p99 и RPS (см. conftest.py).
+"""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+
+def test_generate_short_code(benchmark):
+    from url_shortener.app.utils.shortener import generate_short_code
+
+    code = benchmark(generate_short_code)
+    assert len(code) == 6
+
+
+def test_redirect_cached(benchmark, client, short_code):
+    response = benchmark(client.get, f"/{short_code}", follow_redirects=False)
+    assert response.status_code == 307
+
+
+def test_redirect_cache_miss(benchmark, client, short_code):
+    from url_shortener.app.db import redis_pool
+    from url_shortener.app.utils.link_cache import l1_cache, cache_key
+
+    def evict():
+        # Каждый раунд начинается с пустых L1 и Redis: замеряется загрузка из БД
+        l1_cache.clear()
+        client.portal.call(redis_pool.get_redis_client().delete, cache_key(short_code))
+
+    response = benchmark.pedantic(
+        client.get, args=(f"/{short_code}",), kwargs={"follow_redirects": False},
+        setup=evict, rounds=200,
+    )
+    assert response.status_code == 307
+
+
+def test_create_link(benchmark, client, auth_headers):
+    response = benchmark(
+        client.post, "/links/shorten", json={"original_url": "https://example.com/new"}, headers=auth_headers,
+    )
+    assert response.status_code == 201
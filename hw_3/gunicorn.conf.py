@@ -0,0 +1,51 @@
+"""
+Production-запуск: gunicorn управляет процессами, каждый воркер - uvicorn.
+
+    gunicorn -c gunicorn.conf.py url_shortener.app.main:app
+
+Число воркеров по умолчанию равно числу ядер (WEB_CONCURRENCY задает его
+явно). У каждого воркера свои пулы БД и Redis, поэтому суммарно к
+PostgreSQL открывается до WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+соединений - это число должно быть меньше max_connections сервера.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Воркеры наследуют окружение: по нему config делит ядра bcrypt (PASSWORD_HASH_CORES) между ними
+os.environ["WEB_CONCURRENCY"] = str(workers)
+# loop="auto" и http="auto": uvloop и httptools, если они установлены
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Приложение загружается в каждом воркере после fork: пулы соединений и
+# фоновые задачи lifespan не должны создаваться в мастер-процессе
+preload_app = False
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+# Периодический перезапуск воркеров ограничивает рост памяти; jitter - чтобы не все сразу.
+# Каждый перезапуск выполняет lifespan, но прогрев (WARMUP_INTERVAL) и построение
+# фильтра Блума (только если его нет в Redis) при этом не повторяются
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "100000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "10000"))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+
+
+def on_starting(server):
+    # Метрики воркеров складываются в общий каталог; файлы прошлого запуска удаляем
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
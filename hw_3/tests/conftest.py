@@ -0,0 +1,37 @@
+"""
+Окружение тестов: SQLite во временном каталоге и fakeredis вместо PostgreSQL и Redis.
+
+DATABASE_URL задается до импорта приложения и не берется из окружения:
+тесты очищают таблицы и не должны попасть в рабочую БД.
+"""
+import os
+import tempfile
+import fakeredis
+import pytest
+
+_db_dir = tempfile.mkdtemp(prefix="shortener-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/tests.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("REAPER_ENABLED", "0")
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Схема в SQLite; миграции не нужны."""
+    from url_shortener.app.db.models import Base
+    from url_shortener.app.db.session import engine
+
+    Base.metadata.create_all(engine)
+    return engine
+
+
+@pytest.fixture(scope="session")
+def fake_redis():
+    """fakeredis вместо общего клиента Redis приложения."""
+    from url_shortener.app.db import redis_pool
+
+    fake = fakeredis.FakeAsyncRedis()
+    redis_pool._client = fake
+    redis_pool._pool = fake.connection_pool
+    return fake
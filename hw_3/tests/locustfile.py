@@ -1,15 +1,89 @@
+"""
+Нагрузочный сценарий: регистрация, логин, заполнение БД ссылками и поток
+редиректов с распределением Ципфа (малая доля ссылок получает большую
+часть переходов, как в реальном трафике).
+
+    locust -f tests/locustfile.py --host http://localhost:8000 \
+        --headless -u 200 -r 20 -t 2m --csv benchmarks/results/locust
+
+Параметры задаются переменными окружения: LOCUST_SEED_LINKS - сколько
+ссылок создать перед началом (по умолчанию 1000), LOCUST_ZIPF_S -
+показатель распределения (по умолчанию 1.1). Перцентили и RPS locust
+пишет в *_stats.csv, их удобно сравнивать между коммитами.
+"""
+import itertools
+import os
+import random
+import uuid
+from gevent.lock import Semaphore
 from locust import HttpUser, task, between
 
+SEED_LINKS = int(os.getenv("LOCUST_SEED_LINKS", "1000"))
+ZIPF_S = float(os.getenv("LOCUST_ZIPF_S", "1.1"))
+SEED_BATCH = 1000
+
+# Ссылки создаются один раз на процесс locust и общие для всех пользователей
+_seed_lock = Semaphore()
+_codes: list[str] = []
+_cum_weights: list[float] = []
+
+
+def _seed(client, headers):
+    with _seed_lock:
+        if _codes:
+            return
+        for start in range(0, SEED_LINKS, SEED_BATCH):
+            size = min(SEED_BATCH, SEED_LINKS - start)
+            response = client.post(
+                "/links/shorten/bulk",
+                json=[{"original_url": f"https://example.com/page/{start + i}"} for i in range(size)],
+                headers=headers,
+                name="/links/shorten/bulk [seed]",
+            )
+            # Неудачная пачка (ошибка, 429) пропускается, редиректы идут по созданным ссылкам
+            if not response.ok:
+                continue
+            _codes.extend(r["short_code"] for r in response.json()["results"] if r.get("short_code"))
+        # Ранг k получает вес 1 / k^s
+        _cum_weights.extend(itertools.accumulate(1 / rank ** ZIPF_S for rank in range(1, len(_codes) + 1)))
+
+
 class LinkShortenerUser(HttpUser):
-    wait_time = between(1, 3)
+    wait_time = between(0.5, 1.5)
+
+    def on_start(self):
+        credentials = {"email": f"load-{uuid.uuid4().hex}@example.com", "password": "load-password"}
+        self.client.post("/auth/register", json=credentials)
+        self.own_codes = []
+        response = self.client.post("/auth/login", json=credentials)
+        if not response.ok:
+            # Без токена пользователь выполняет только редиректы
+            self.headers = None
+            return
+        self.headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        _seed(self.client, self.headers)
 
-    @task
+    @task(20)
+    def redirect(self):
+        # Ни одна ссылка не создана: переходить некуда
+        if not _codes:
+            return
+        code = random.choices(_codes, cum_weights=_cum_weights)[0]
+        self.client.get(f"/{code}", allow_redirects=False, name="/[short_code]")
+
+    @task(2)
     def create_link(self):
-        self.client.post("/links/shorten", json={
-            "original_url": "https://example.com/some-long-url"
-        })
-
-    @task
-    def get_link(self):
-        # Здесь подставьте реально существующий short_code или настройте создание ссылки через setup
-        self.client.get("/somecode")
+        if not self.headers:
+            return
+        response = self.client.post(
+            "/links/shorten",
+            json={"original_url": f"https://example.com/new/{uuid.uuid4().hex}"},
+            headers=self.headers,
+        )
+        if response.status_code == 201:
+            self.own_codes.append(response.json()["short_code"])
+
+    @task(1)
+    def link_stats(self):
+        if self.own_codes:
+            self.client.get(f"/links/{random.choice(self.own_codes)}/stats", headers=self.headers, name="/links/[short_code]/stats")
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from url_shortener.app.api.dependencies import get_current_user
+from url_shortener.app.api.routers import links
+from url_shortener.app.db.models import Link
+from url_shortener.app.db.session import SessionLocal
+from url_shortener.app.main import app
+from url_shortener.app.schemas.user import CurrentUser
+
+class StubGenerator:
+    """Выдает заранее заданные пачки кодов; последняя пачка повторяется."""
+
+    def __init__(self, *batches):
+        self.batches = list(batches)
+        self.calls = 0
+
+    async def next_codes(self, db, n):
+        self.calls += 1
+        batch = self.batches.pop(0) if len(self.batches) > 1 else self.batches[0]
+        return batch[:n]
+
+
+@pytest.fixture(scope="module")
+def client(database, fake_redis):
+    # lifespan (фоновые задачи) не запускается
+    app.dependency_overrides[get_current_user] = lambda: CurrentUser(id=1, email="bulk@example.com")
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_current_user, None)
+
+
+@pytest.fixture
+def existing_code():
+    with SessionLocal() as db:
+        db.query(Link).delete()
+        db.add(Link(original_url="https://example.com/taken", short_code="exist1", owner_id=1, click_count=0))
+        db.commit()
+    return "exist1"
+
+
+def test_bulk_reports_validation_and_alias_errors(client, existing_code):
+    response = client.post("/links/shorten/bulk", json=[
+        {"original_url": "https://example.com/a", "alias": "alias1"},
+        {"original_url": "not-a-url"},
+        {"original_url": "https://example.com/b", "alias": existing_code},
+        {"original_url": "https://example.com/c", "alias": "alias1"},
+    ])
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 1 and body["failed"] == 3
+    results = body["results"]
+    assert results[0]["short_code"] == "alias1"
+    assert results[1]["error"]
+    assert results[2]["error"] == "Alias already exists"
+    assert results[3]["error"] == "Alias already exists"
+
+
+def test_bulk_retries_generated_code_conflicts(client, existing_code, monkeypatch):
+    # Первая пачка: код уже занят в БД и повтор внутри пачки; оба элемента получают новые коды
+    generator = StubGenerator([existing_code, "new001", "new001"], ["new002", "new003"])
+    monkeypatch.setattr(links, "get_code_generator", lambda db: generator)
+    response = client.post("/links/shorten/bulk", json=[{"original_url": f"https://example.com/{i}"} for i in range(3)])
+    body = response.json()
+    assert body["created"] == 3
+    assert {result["short_code"] for result in body["results"]} == {"new001", "new002", "new003"}
+    assert generator.calls == 2
+
+
+def test_bulk_gives_up_after_max_attempts(client, existing_code, monkeypatch):
+    generator = StubGenerator([existing_code])
+    monkeypatch.setattr(links, "get_code_generator", lambda db: generator)
+    body = client.post("/links/shorten/bulk", json=[{"original_url": "https://example.com/x"}]).json()
+    assert body["created"] == 0
+    assert body["results"][0]["error"] == "Could not generate a unique short code"
+    assert generator.calls == links.SHORT_CODE_MAX_ATTEMPTS
+
+
+def test_bulk_limits_items_and_rejects_bad_bodies(client, monkeypatch):
+    monkeypatch.setattr(links, "BULK_MAX_ITEMS", 2)
+    items = [{"original_url": f"https://example.com/{i}"} for i in range(3)]
+    assert client.post("/links/shorten/bulk", json=items).status_code == 413
+    ndjson = "\n".join(json.dumps(item) for item in items)
+    response = client.post("/links/shorten/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+    assert client.post("/links/shorten/bulk", json={"original_url": "https://example.com"}).status_code == 422
+    assert client.post("/links/shorten/bulk", content="[{\"original_url\": ", headers={"Content-Type": "application/json"}).status_code == 400
+
+
+def test_json_array_is_parsed_incrementally():
+    items = [{"original_url": "https://example.com/ü"}, {"alias": "a,b]"}, 12345, [1, 2]]
+    body = json.dumps(items).encode()
+
+    async def one_byte_chunks():
+        for i in range(len(body)):
+            yield body[i:i + 1]
+
+    async def collect():
+        return [item async for item in links._iter_json_array(one_byte_chunks())]
+
+    assert asyncio.run(collect()) == items
+
@@ -0,0 +1,20 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from url_shortener.app.db.models import Link
+from url_shortener.app.db.session import AsyncSessionLocal, SessionLocal
+from url_shortener.app.reaper import reap_expired_links
+
+
+def test_reaper_keeps_links_within_grace_period(database, fake_redis):
+    now = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        db.query(Link).delete()
+        db.add(Link(original_url="https://example.com/recent", short_code="recent", owner_id=1, click_count=0, expires_at=now - timedelta(days=1)))
+        db.add(Link(original_url="https://example.com/old", short_code="old001", owner_id=1, click_count=0, expires_at=now - timedelta(days=40)))
+        db.add(Link(original_url="https://example.com/forever", short_code="forever", owner_id=1, click_count=0))
+        db.commit()
+
+    deleted = asyncio.run(reap_expired_links(fake_redis, AsyncSessionLocal, pause=0, grace_days=30))
+    assert deleted == 1
+    with SessionLocal() as db:
+        assert sorted(link.short_code for link in db.query(Link)) == ["forever", "recent"]
@@ -4,17 +4,356 @@ from url_shortener.app.db.models import Link
 from url_shortener.app.utils.shortener import generate_short_code
 
 # Пример юнит-теста для генерации кода
-def test_generate_short_code_uniqueness(monkeypatch):
-    # Мокаем функцию, возвращающую записи из базы
+def test_generate_short_code_length():
+    # Код генерируется без запросов в БД, уникальность обеспечивает индекс
+    code = generate_short_code(length=6)
+    assert isinstance(code, str)
+    assert len(code) == 6
+
+def test_base62_encode():
+    from url_shortener.app.utils.shortener import base62_encode
+
+    assert base62_encode(0) == "0"
+    assert base62_encode(61) == "Z"
+    assert base62_encode(62) == "10"
+    assert len(base62_encode(62 ** 5)) == 6
+
+def test_sequence_generator_reserves_blocks():
+    import asyncio
+    from url_shortener.app.utils.shortener import SequenceCodeGenerator, base62_encode
+
     class DummyDB:
-        def query(self, model):
-            return self
-        def filter(self, condition):
-            return self
-        def first(self):
-            return None  # всегда нет записи с таким кодом
+        # Имитирует nextval последовательности с шагом 3
+        def __init__(self):
+            self.calls = 0
+        async def scalar(self, stmt):
+            self.calls += 1
+            return 1 + (self.calls - 1) * 3
 
     db = DummyDB()
-    code = generate_short_code(db, length=6)
-    assert isinstance(code, str)
-    assert len(code) == 6
+    generator = SequenceCodeGenerator(block_size=3, offset=0)
+    codes = asyncio.run(generator.next_codes(db, 4))
+    assert codes == [base62_encode(i) for i in (1, 2, 3, 4)]
+    assert db.calls == 2
+
+def test_click_buffer_aggregates_clicks():
+    from datetime import datetime, timezone
+    from url_shortener.app.utils.clicks import ClickBuffer
+
+    first = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+    second = datetime(2024, 1, 1, 12, 5, tzinfo=timezone.utc)
+    buffer = ClickBuffer()
+    # Порядок записей в пачке не обязан совпадать со временем: берется последний переход
+    buffer.record("abc", second)
+    buffer.record("abc", first)
+    buffer.record("xyz", first)
+
+    rows = {row["code"]: (row["n"], row["ts"]) for row in buffer.drain()}
+    assert rows == {"abc": (2, second), "xyz": (1, first)}
+    assert buffer.drain() == []
+
+def test_ttl_cache_evicts_lru_and_expired(monkeypatch):
+    from url_shortener.app.utils import local_cache
+
+    now = [0.0]
+    monkeypatch.setattr(local_cache.time, "monotonic", lambda: now[0])
+    cache = local_cache.TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # вытесняет "b" как давно не использованную
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+
+    now[0] = 11
+    assert cache.get("c") is None
+    assert len(cache) == 1
+
+def test_bloom_filter_positions_are_stable():
+    from url_shortener.app.utils.bloom import RedisBloomFilter
+
+    bloom = RedisBloomFilter("bloom:test", size_bits=1024, num_hashes=5)
+    positions = bloom._positions("abc123")
+    assert positions == bloom._positions("abc123")
+    assert len(positions) == 5
+    assert all(0 <= pos < 1024 for pos in positions)
+
+def test_bloom_filter_add_during_rebuild_survives_rename():
+    import asyncio
+    from url_shortener.app.utils.bloom import RedisBloomFilter
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis()
+    bloom = RedisBloomFilter("bloom:test", size_bits=1024, num_hashes=5)
+
+    async def scenario():
+        # Код создан во время перестроения, скан его не увидел; затем tmp подменяет рабочий ключ
+        await redis.set(bloom.rebuilding_key, 1)
+        await bloom.add(redis, "late01")
+        await redis.setbit(bloom.tmp_key, 1023, 0)
+        await redis.rename(bloom.tmp_key, bloom.key)
+        return await bloom.might_contain(redis, "late01")
+
+    assert asyncio.run(scenario())
+
+def test_single_flight_coalesces_concurrent_calls():
+    import asyncio
+    from url_shortener.app.utils.singleflight import SingleFlight
+
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "https://example.com"
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(*(flights.do("abc", load) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert results == ["https://example.com"] * 10
+    assert len(calls) == 1
+
+def test_current_user_is_cached_between_requests():
+    import asyncio
+    from url_shortener.app.api.routers import auth
+    from url_shortener.app.utils.security import create_access_token
+
+    class DummyUser:
+        id = 42
+        email = "user@example.com"
+
+    class DummyDB:
+        def __init__(self):
+            self.calls = 0
+        async def get(self, model, user_id):
+            self.calls += 1
+            return DummyUser()
+
+    auth.token_cache.clear()
+    auth.user_cache.clear()
+    db = DummyDB()
+    token = create_access_token(data={"sub": "42"})
+    for _ in range(3):
+        user = asyncio.run(auth.get_current_user_from_token(token, db))
+        assert user.id == 42
+    assert db.calls == 1
+
+def test_password_hasher_runs_bcrypt_in_process_pool():
+    import asyncio
+    from url_shortener.app.utils.password_hasher import PasswordHasher
+
+    async def scenario():
+        hasher = PasswordHasher(workers=2, max_queue=10)
+        try:
+            hashed = await hasher.hash("secret")
+            results = await asyncio.gather(
+                hasher.verify("secret", hashed),
+                hasher.verify("wrong", hashed),
+                hasher.verify("secret", hashed),
+            )
+            return results, hasher.stats()
+        finally:
+            hasher.shutdown()
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, False, True]
+    assert stats["completed"] == 4
+    assert stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+def test_click_rollup_rows_bucket_by_granularity():
+    from datetime import datetime, timezone
+    from url_shortener.app.utils.click_stream import event_time, rollup_rows
+
+    ts = event_time(b"1700000000123-0")
+    assert ts == datetime(2023, 11, 14, 22, 13, 20, 123000, tzinfo=timezone.utc)
+    rows = rollup_rows([("abc", ts), ("abc", ts.replace(minute=59)), ("xyz", ts)])
+    counts = {(row["short_code"], row["granularity"], row["bucket"]): row["clicks"] for row in rows}
+    assert counts[("abc", "minute", ts.replace(second=0, microsecond=0))] == 1
+    assert counts[("abc", "hour", ts.replace(minute=0, second=0, microsecond=0))] == 2
+    assert counts[("abc", "day", ts.replace(hour=0, minute=0, second=0, microsecond=0))] == 2
+    assert counts[("xyz", "day", ts.replace(hour=0, minute=0, second=0, microsecond=0))] == 1
+
+def test_cache_ttl_is_bounded_by_link_expiry():
+    from datetime import datetime, timedelta, timezone
+    from url_shortener.app.utils.link_cache import cache_ttl
+
+    now = datetime.now(timezone.utc)
+    assert cache_ttl(None, ttl=3600) == 3600
+    assert cache_ttl(now + timedelta(days=1), ttl=3600) == 3600
+    assert 100 <= cache_ttl(now + timedelta(seconds=120), ttl=3600) <= 120
+    assert cache_ttl(now - timedelta(seconds=1), ttl=3600) == 0
+    # SQLite отдает время без часового пояса
+    assert cache_ttl((now + timedelta(seconds=60)).replace(tzinfo=None), ttl=3600) > 0
+
+def test_expired_link_is_cached_and_waiters_stop_without_lock():
+    import asyncio
+    import time
+    from datetime import datetime, timedelta, timezone
+    from url_shortener.app.utils import link_cache
+
+    fakeredis = pytest.importorskip("fakeredis")
+    redis = fakeredis.FakeAsyncRedis()
+    expired_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    async def loader(short_code):
+        return ("https://example.com", expired_at)
+
+    async def scenario():
+        await link_cache.load_through_cache(redis, "old001", loader)
+        link_cache.l1_cache.clear()
+        cached = await link_cache.get_cached_url(redis, "old001")
+        # Загрузка другого воркера завершилась без записи в кэш: ждать весь таймаут не нужно
+        await redis.set("lock:link:gone01", "token", px=100)
+        started = time.monotonic()
+        waited = await link_cache._wait_for_cache(redis, "gone01")
+        return cached, waited, time.monotonic() - started
+
+    cached, waited, elapsed = asyncio.run(scenario())
+    assert cached == link_cache.EXPIRED
+    assert waited is link_cache._NOT_READY
+    assert elapsed < link_cache.CACHE_LOCK_TIMEOUT
+
+def test_instrumented_engine_records_query_timings():
+    from sqlalchemy import create_engine, text
+    from url_shortener.app.core.metrics import DB_QUERY_LATENCY, instrument_engine
+
+    def select_count():
+        return next((
+            s.value for s in DB_QUERY_LATENCY.collect()[0].samples
+            if s.name == "db_query_duration_seconds_count" and s.labels["operation"] == "SELECT"
+        ), 0)
+
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    before = select_count()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        conn.execute(text("select 2"))
+    assert select_count() == before + 2
+
+def test_click_stream_consumer_acks_trimmed_and_claims_all_pages(monkeypatch):
+    import asyncio
+    import fakeredis
+    from url_shortener.app.utils import click_stream
+    from url_shortener.app.utils.click_stream import CLICK_STREAM_GROUP, CLICK_STREAM_KEY, ClickStreamConsumer
+
+    class TrimmingRedis(fakeredis.FakeAsyncRedis):
+        # fakeredis не обрезает записи в PEL: имитируем ответ Redis для удаленной MAXLEN записи
+        trimmed = set()
+
+        async def xreadgroup(self, *args, **kwargs):
+            response = await super().xreadgroup(*args, **kwargs)
+            for _, entries in response:
+                entries[:] = [(entry_id, None if entry_id in self.trimmed else fields) for entry_id, fields in entries]
+            return response
+
+    monkeypatch.setattr(click_stream, "CLICK_STREAM_CLAIM_IDLE", 0)
+
+    async def scenario():
+        redis = TrimmingRedis()
+        stored = []
+        dead = ClickStreamConsumer(redis, None, batch_size=2)
+        dead.consumer = "dead"
+        await dead.ensure_group()
+        ids = [await redis.xadd(CLICK_STREAM_KEY, {"code": f"c{i}"}) for i in range(5)]
+        # Упавший воркер взял все записи и не подтвердил их
+        await redis.xreadgroup(CLICK_STREAM_GROUP, "dead", {CLICK_STREAM_KEY: ">"}, count=5)
+        TrimmingRedis.trimmed = {ids[0]}
+
+        consumer = ClickStreamConsumer(redis, None, batch_size=2)
+
+        async def store(events, counters):
+            stored.extend(code for code, _ in events)
+        consumer._store = store
+        await consumer.claim_stale()
+        await consumer.stop()
+        pending = await redis.xpending(CLICK_STREAM_KEY, CLICK_STREAM_GROUP)
+        return stored, pending["pending"]
+
+    stored, pending = asyncio.run(scenario())
+    assert sorted(stored) == ["c1", "c2", "c3", "c4"]
+    assert pending == 0
+
+def test_invalidation_listener_keeps_l1_on_quiet_channel():
+    import asyncio
+    import fakeredis
+    from url_shortener.app.utils.link_cache import INVALIDATION_CHANNEL, l1_cache, listen_invalidations
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis()
+        task = asyncio.create_task(listen_invalidations(redis, poll_timeout=0.05))
+        await asyncio.sleep(0.1)
+        l1_cache.set("quiet", "https://example.com/quiet")
+        l1_cache.set("gone", "https://example.com/gone")
+        # Несколько таймаутов ожидания подряд не сбрасывают L1
+        await asyncio.sleep(0.3)
+        kept = l1_cache.get("quiet")
+        await redis.publish(INVALIDATION_CHANNEL, "gone")
+        await asyncio.sleep(0.1)
+        removed = l1_cache.get("gone")
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return kept, removed
+
+    kept, removed = asyncio.run(scenario())
+    assert kept == "https://example.com/quiet"
+    assert removed is None
+
+def test_click_stream_consumer_recreates_lost_group():
+    import asyncio
+    import fakeredis
+    from url_shortener.app.utils.click_stream import CLICK_STREAM_KEY, ClickStreamConsumer
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis()
+        stored = []
+        consumer = ClickStreamConsumer(redis, None, interval=0.05)
+
+        async def store(events, counters):
+            stored.extend(code for code, _ in events)
+        consumer._store = store
+        consumer.start()
+        await redis.xadd(CLICK_STREAM_KEY, {"code": "before"})
+        await asyncio.sleep(0.2)
+        # Redis потерял данные вместе с группой потребителей
+        await redis.flushall()
+        await redis.xadd(CLICK_STREAM_KEY, {"code": "after"})
+        await asyncio.sleep(0.3)
+        await consumer.stop()
+        return stored
+
+    assert asyncio.run(scenario()) == ["before", "after"]
+
+def test_warm_up_once_is_not_repeated_by_restarted_workers(monkeypatch):
+    import asyncio
+    import fakeredis
+    from url_shortener.app import warmup
+
+    calls = []
+
+    async def fake_warm_up(redis, session_factory):
+        calls.append(session_factory)
+        if session_factory == "broken":
+            raise RuntimeError("db is down")
+        return 5
+
+    monkeypatch.setattr(warmup, "warm_up_cache", fake_warm_up)
+
+    async def scenario():
+        redis = fakeredis.FakeAsyncRedis()
+        # Неудачный прогрев снимает блокировку, следующий воркер повторяет его
+        try:
+            await warmup.warm_up_once(redis, "broken")
+        except RuntimeError:
+            pass
+        first = await warmup.warm_up_once(redis, "db", interval=60)
+        # Перезапущенный воркер в пределах интервала прогрев не повторяет
+        second = await warmup.warm_up_once(redis, "db", interval=60)
+        return first, second, await redis.ttl(warmup.WARMUP_LOCK_KEY)
+
+    first, second, ttl = asyncio.run(scenario())
+    assert (first, second) == (5, 0)
+    assert calls == ["broken", "db"]
+    assert 0 < ttl <= 60
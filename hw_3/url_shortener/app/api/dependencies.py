@@ -1,23 +1,39 @@
-from url_shortener.app.db.session import SessionLocal
+from url_shortener.app.db.session import AsyncSessionLocal, ReadSessionLocal, replica_engines
 from fastapi import Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordBearer
-from url_shortener.app.core.config import REDIS_URL
-import redis
+from url_shortener.app.db.redis_pool import get_redis_client
+from url_shortener.app.core.config import REPLICA_STICKY_SECONDS
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
     # Импортируем вспомогательную функцию из auth
     from url_shortener.app.api.routers.auth import get_current_user_from_token
-    return get_current_user_from_token(token, db)
+    return await get_current_user_from_token(token, db)
 
 def get_redis():
-    return redis.Redis.from_url(REDIS_URL)
\ No newline at end of file
+    # Общий клиент поверх пула соединений, созданного в lifespan приложения
+    return get_redis_client()
+
+def _primary_pin_key(user_id: int) -> str:
+    return f"primary-pin:{user_id}"
+
+async def pin_to_primary(redis, user_id: int):
+    # После записи пользователь какое-то время читает из основной БД, чтобы видеть свои изменения
+    if replica_engines:
+        await redis.set(_primary_pin_key(user_id), 1, ex=REPLICA_STICKY_SECONDS)
+
+async def get_read_session_factory(current_user = Depends(get_current_user), redis = Depends(get_redis)):
+    if not replica_engines or await redis.exists(_primary_pin_key(current_user.id)):
+        return AsyncSessionLocal
+    return ReadSessionLocal
+
+async def get_read_db(session_factory = Depends(get_read_session_factory)):
+    # Только для обработчиков без записи: сессия может быть открыта на реплике
+    async with session_factory() as db:
+        yield db
@@ -1,10 +1,23 @@
+import hashlib
+import time
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from url_shortener.app.schemas.user import UserCreate, UserRead, Token
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from url_shortener.app.schemas.user import UserCreate, UserRead, Token, CurrentUser
 from url_shortener.app.db.models import User
-from url_shortener.app.db.session import SessionLocal
-from url_shortener.app.utils.security import get_password_hash, verify_password, create_access_token
-from url_shortener.app.core.config import ACCESS_TOKEN_EXPIRE_MINUTES, JWT_SECRET, JWT_ALGORITHM
+from url_shortener.app.api.dependencies import get_db
+from url_shortener.app.utils.security import create_access_token
+from url_shortener.app.utils.password_hasher import password_hasher
+from url_shortener.app.core.config import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    JWT_SECRET,
+    JWT_ALGORITHM,
+    TOKEN_CACHE_SIZE,
+    TOKEN_CACHE_TTL,
+    USER_CACHE_SIZE,
+    USER_CACHE_TTL,
+)
+from url_shortener.app.utils.local_cache import TTLCache
 from datetime import timedelta
 
 router = APIRouter(
@@ -12,37 +25,59 @@ router = APIRouter(
     tags=["auth"]
 )
 
+# Проверенные токены: sha256(token) -> id пользователя, запись живет не дольше exp токена
+token_cache = TTLCache(TOKEN_CACHE_SIZE, TOKEN_CACHE_TTL)
+# Учетные записи: id пользователя -> CurrentUser. API не изменяет и не удаляет
+# пользователей, поэтому кэш обновляется только по USER_CACHE_TTL; удаленный
+# напрямую в БД пользователь перестает проходить проверку не позже чем через TTL
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
 @router.post("/register", response_model=UserRead)
-def register(user: UserCreate, db: Session = Depends(lambda: SessionLocal())):
-    existing = db.query(User).filter(User.email == user.email).first()
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = await db.scalar(select(User).where(User.email == user.email))
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    # bcrypt намеренно медленный, поэтому выполняем его в пуле процессов
+    hashed_password = await password_hasher.hash(user.password)
     new_user = User(email=user.email, password_hash=hashed_password)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/login", response_model=Token)
-def login(user: UserCreate, db: Session = Depends(lambda: SessionLocal())):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+async def login(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if not db_user or not await password_hasher.verify(user.password, db_user.password_hash):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(data={"sub": str(db_user.id)}, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
 
-def get_current_user_from_token(token: str, db: Session):
+async def get_current_user_from_token(token: str, db: AsyncSession):
     from jose import JWTError, jwt
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("sub")
-        if user_id is None:
+    token_hash = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    user_id = token_cache.get(token_hash)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+        except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user = db.query(User).get(int(user_id))
+        user_id = int(user_id)
+        exp = payload.get("exp")
+        ttl = min(TOKEN_CACHE_TTL, exp - time.time()) if exp else TOKEN_CACHE_TTL
+        if ttl > 0:
+            token_cache.set(token_hash, user_id, ttl=ttl)
+    user = user_cache.get(user_id)
     if user is None:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        # В БД идем только при промахе кэша учетных записей
+        db_user = await db.get(User, user_id)
+        if db_user is None:
+            token_cache.delete(token_hash)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+        user = CurrentUser(id=db_user.id, email=db_user.email)
+        user_cache.set(user_id, user)
     return user
@@ -1,10 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from sqlalchemy.orm import Session
+import codecs
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy import select, delete, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from typing import List
-from url_shortener.app.schemas.link import LinkCreate, LinkUpdate, LinkRead
-from url_shortener.app.db.models import Link
-from url_shortener.app.api.dependencies import get_db, get_current_user, get_redis
+from typing import List, Optional
+from url_shortener.app.schemas.link import LinkCreate, LinkUpdate, LinkRead, BulkLinkResult, BulkLinkResponse, ClickTimeseries, ClickPoint
+from url_shortener.app.db.models import Link, ClickRollup
+from url_shortener.app.api.dependencies import (
+    get_db,
+    get_read_db,
+    get_read_session_factory,
+    get_current_user,
+    get_redis,
+    pin_to_primary,
+)
+from url_shortener.app.utils.click_stream import GRANULARITIES
+from url_shortener.app.utils.shortener import get_code_generator
+from url_shortener.app.core.config import (
+    SHORT_CODE_MAX_ATTEMPTS,
+    BULK_MAX_ITEMS,
+    BULK_INSERT_CHUNK_SIZE,
+    BULK_MAX_ITEM_BYTES,
+    LINKS_PAGE_SIZE,
+    LINKS_MAX_PAGE_SIZE,
+    LINKS_STREAM_BATCH_SIZE,
+    TIMESERIES_MAX_POINTS,
+)
+from url_shortener.app.utils.link_cache import invalidate_links, register_new_links, cache_missing
 
 router = APIRouter(
     prefix="/links",
@@ -12,64 +39,346 @@ router = APIRouter(
 )
 
 @router.post("/shorten", response_model=LinkRead, status_code=status.HTTP_201_CREATED)
-def create_link(link_data: LinkCreate, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    if link_data.alias:
-        existing = db.query(Link).filter(Link.short_code == link_data.alias).first()
-        if existing:
-            raise HTTPException(status_code=400, detail="Alias already exists")
-        short_code = link_data.alias
+async def create_link(link_data: LinkCreate, db: AsyncSession = Depends(get_db), redis = Depends(get_redis), current_user = Depends(get_current_user)):
+    code_generator = get_code_generator(db)
+    # После rollback объекты сессии устаревают, поэтому id владельца читаем заранее
+    owner_id = current_user.id if current_user else None
+    # Уникальность кода гарантирует UNIQUE-индекс: при конфликте берем следующий код
+    for _ in range(SHORT_CODE_MAX_ATTEMPTS):
+        short_code = link_data.alias or await code_generator.next_code(db)
+        new_link = Link(
+            original_url=str(link_data.original_url),
+            short_code=short_code,
+            expires_at=link_data.expires_at,
+            owner_id=owner_id
+        )
+        db.add(new_link)
+        try:
+            await db.commit()
+            break
+        except IntegrityError:
+            await db.rollback()
+            if link_data.alias:
+                raise HTTPException(status_code=400, detail="Alias already exists")
     else:
-        from url_shortener import generate_short_code
-        short_code = generate_short_code(db)
-    new_link = Link(
-        original_url=link_data.original_url,
-        short_code=short_code,
-        expires_at=link_data.expires_at,
-        owner_id=current_user.id if current_user else None
-    )
-    db.add(new_link)
-    db.commit()
-    db.refresh(new_link)
+        raise HTTPException(status_code=503, detail="Could not generate a unique short code")
+    if owner_id is not None:
+        await pin_to_primary(redis, owner_id)
+    # Сразу кладем ссылку в кэш: первый редирект не зависит от задержки реплики
+    await register_new_links(redis, {short_code: (new_link.original_url, new_link.expires_at)})
+    await db.refresh(new_link)
     return new_link
 
+_json_decoder = json.JSONDecoder()
+
+def _item_too_large():
+    return HTTPException(status_code=413, detail=f"Item is larger than {BULK_MAX_ITEM_BYTES} bytes")
+
+async def _iter_json_array(chunks):
+    """
+    Элементы JSON-массива по мере чтения тела запроса.
+
+    Массив не разбирается целиком: в памяти только недочитанный элемент,
+    поэтому лимит BULK_MAX_ITEMS ограничивает и память, а не только ответ.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, state, eof = "", 0, "start", False
+    chunks = chunks.__aiter__()
+    while True:
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n":
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise HTTPException(status_code=422, detail="Expected a JSON array of links")
+                state, pos = "first", pos + 1
+            elif state == "first" and char == "]":
+                state, pos = "end", pos + 1
+            elif state in ("first", "item"):
+                try:
+                    item, end = _json_decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise HTTPException(status_code=400, detail="Invalid JSON")
+                    if len(buffer) - pos > BULK_MAX_ITEM_BYTES:
+                        raise _item_too_large()
+                    break  # элемент еще не дочитан
+                if end == len(buffer) and not eof:
+                    break  # число могло оборваться на границе куска
+                yield item
+                state, pos = "separator", end
+            elif state == "separator" and char in ",]":
+                state, pos = ("item" if char == "," else "end"), pos + 1
+            else:
+                raise HTTPException(status_code=400, detail="Invalid JSON")
+        if eof:
+            if state != "end":
+                raise HTTPException(status_code=400, detail="Invalid JSON")
+            return
+        buffer, pos = buffer[pos:], 0
+        try:
+            buffer += decoder.decode(await chunks.__anext__())
+        except StopAsyncIteration:
+            eof = True
+            buffer += decoder.decode(b"", final=True)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON")
+
+async def _iter_bulk_payload(request: Request):
+    # Тело читается потоком: NDJSON построчно, JSON-массив поэлементно
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+            if len(buffer) > BULK_MAX_ITEM_BYTES:
+                raise _item_too_large()
+        if buffer.strip():
+            yield buffer
+        return
+    async for item in _iter_json_array(request.stream()):
+        yield item
+
+async def _insert_links(db: AsyncSession, rows: list[dict]) -> set[str]:
+    """Многострочный INSERT ... ON CONFLICT DO NOTHING RETURNING; возвращает вставленные коды."""
+    insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    inserted = set()
+    for start in range(0, len(rows), BULK_INSERT_CHUNK_SIZE):
+        stmt = (
+            insert(Link)
+            .values(rows[start:start + BULK_INSERT_CHUNK_SIZE])
+            .on_conflict_do_nothing(index_elements=["short_code"])
+            .returning(Link.short_code)
+        )
+        inserted.update((await db.scalars(stmt)).all())
+    return inserted
+
+@router.post(
+    "/shorten/bulk",
+    response_model=BulkLinkResponse,
+    openapi_extra={"requestBody": {"required": True, "content": {
+        "application/json": {"schema": {"type": "array", "items": LinkCreate.model_json_schema()}},
+        "application/x-ndjson": {"schema": {"type": "string"}},
+    }}},
+)
+async def create_links_bulk(request: Request, db: AsyncSession = Depends(get_db), redis = Depends(get_redis), current_user = Depends(get_current_user)):
+    owner_id = current_user.id
+    results: dict[int, BulkLinkResult] = {}
+    valid: list[tuple[int, LinkCreate]] = []
+    index = -1
+    async for raw in _iter_bulk_payload(request):
+        index += 1
+        if index >= BULK_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Too many links, max {BULK_MAX_ITEMS}")
+        try:
+            item = LinkCreate.model_validate_json(raw) if isinstance(raw, bytes) else LinkCreate.model_validate(raw)
+        except ValidationError as e:
+            results[index] = BulkLinkResult(index=index, error="; ".join(err["msg"] for err in e.errors()))
+            continue
+        valid.append((index, item))
+
+    # Занятые alias ищем одним запросом на пачку, а не по запросу на ссылку
+    aliases = list({item.alias for _, item in valid if item.alias})
+    taken = set()
+    for start in range(0, len(aliases), BULK_INSERT_CHUNK_SIZE):
+        chunk = aliases[start:start + BULK_INSERT_CHUNK_SIZE]
+        taken.update((await db.scalars(select(Link.short_code).where(Link.short_code.in_(chunk)))).all())
+    pending = []
+    for index, item in valid:
+        if item.alias and item.alias in taken:
+            results[index] = BulkLinkResult(index=index, error="Alias already exists")
+            continue
+        if item.alias:
+            taken.add(item.alias)
+        pending.append((index, item))
+
+    code_generator = get_code_generator(db)
+    created: dict[str, tuple[str, Optional[datetime]]] = {}
+    for _ in range(SHORT_CODE_MAX_ATTEMPTS):
+        if not pending:
+            break
+        codes = iter(await code_generator.next_codes(db, sum(1 for _, item in pending if not item.alias)))
+        batch, retry = {}, []
+        for index, item in pending:
+            short_code = item.alias or next(codes)
+            if short_code in batch:
+                retry.append((index, item))
+                continue
+            batch[short_code] = (index, item)
+        inserted = await _insert_links(db, [
+            {
+                "original_url": str(item.original_url),
+                "short_code": short_code,
+                "expires_at": item.expires_at,
+                "owner_id": owner_id,
+                "click_count": 0,
+            }
+            for short_code, (index, item) in batch.items()
+        ])
+        for short_code, (index, item) in batch.items():
+            if short_code in inserted:
+                results[index] = BulkLinkResult(index=index, short_code=short_code)
+                created[short_code] = (str(item.original_url), item.expires_at)
+            elif item.alias:
+                # alias успели занять параллельным запросом
+                results[index] = BulkLinkResult(index=index, error="Alias already exists")
+            else:
+                retry.append((index, item))
+        pending = retry
+    for index, _ in pending:
+        results[index] = BulkLinkResult(index=index, error="Could not generate a unique short code")
+    await db.commit()
+
+    await pin_to_primary(redis, owner_id)
+    if created:
+        await register_new_links(redis, created)
+    return BulkLinkResponse(
+        created=len(created),
+        failed=len(results) - len(created),
+        results=[results[i] for i in sorted(results)],
+    )
+
 @router.delete("/{short_code}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_link(short_code: str, db: Session = Depends(get_db), redis = Depends(get_redis), current_user = Depends(get_current_user)):
-    link = db.query(Link).filter(Link.short_code == short_code, Link.owner_id == current_user.id).first()
+async def delete_link(short_code: str, db: AsyncSession = Depends(get_db), redis = Depends(get_redis), current_user = Depends(get_current_user)):
+    link = await db.scalar(select(Link).where(Link.short_code == short_code, Link.owner_id == current_user.id))
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
-    db.delete(link)
-    db.commit()
-    redis.delete(f"link:{short_code}")
+    await db.delete(link)
+    await db.execute(delete(ClickRollup).where(ClickRollup.short_code == short_code))
+    await db.commit()
+    await pin_to_primary(redis, current_user.id)
+    await invalidate_links(redis, short_code)
+    await cache_missing(redis, short_code)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 @router.put("/{short_code}", response_model=LinkRead)
-def update_link(short_code: str, link_update: LinkUpdate, db: Session = Depends(get_db), redis = Depends(get_redis), current_user = Depends(get_current_user)):
-    link = db.query(Link).filter(Link.short_code == short_code, Link.owner_id == current_user.id).first()
+async def update_link(short_code: str, link_update: LinkUpdate, db: AsyncSession = Depends(get_db), redis = Depends(get_redis), current_user = Depends(get_current_user)):
+    link = await db.scalar(select(Link).where(Link.short_code == short_code, Link.owner_id == current_user.id))
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
     if link_update.alias and link_update.alias != short_code:
-        existing = db.query(Link).filter(Link.short_code == link_update.alias).first()
+        existing = await db.scalar(select(Link).where(Link.short_code == link_update.alias))
         if existing:
             raise HTTPException(status_code=400, detail="Alias already exists")
-        redis.delete(f"link:{short_code}")
         link.short_code = link_update.alias
+        # Агрегаты переходов переезжают вместе с кодом
+        await db.execute(
+            update(ClickRollup).where(ClickRollup.short_code == short_code).values(short_code=link_update.alias)
+        )
     if link_update.original_url:
-        link.original_url = link_update.original_url
-        redis.delete(f"link:{link.short_code}")
+        link.original_url = str(link_update.original_url)
     if link_update.expires_at:
         link.expires_at = link_update.expires_at
-    db.commit()
-    db.refresh(link)
+    await db.commit()
+    await pin_to_primary(redis, current_user.id)
+    # Сбрасываем кэш после коммита, чтобы воркеры не закэшировали старое значение, и
+    # сразу кладем новое: промах кэша мог бы прочитать с реплики еще старую строку
+    await invalidate_links(redis, short_code, link.short_code)
+    await register_new_links(redis, {link.short_code: (link.original_url, link.expires_at)})
+    await db.refresh(link)
     return link
 
 @router.get("/{short_code}/stats", response_model=LinkRead)
-def link_stats(short_code: str, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    link = db.query(Link).filter(Link.short_code == short_code, Link.owner_id == current_user.id).first()
+async def link_stats(short_code: str, db: AsyncSession = Depends(get_read_db), current_user = Depends(get_current_user)):
+    link = await db.scalar(select(Link).where(Link.short_code == short_code, Link.owner_id == current_user.id))
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
     return link
 
-@router.get("/search", response_model=List[LinkRead])
-def search_links(original_url: str, db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    links = db.query(Link).filter(Link.original_url == original_url, Link.owner_id == current_user.id).all()
+@router.get("/{short_code}/stats/timeseries", response_model=ClickTimeseries)
+async def link_stats_timeseries(
+    short_code: str,
+    granularity: str = Query("hour", pattern="^(" + "|".join(GRANULARITIES) + ")$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(TIMESERIES_MAX_POINTS, ge=1, le=TIMESERIES_MAX_POINTS),
+    db: AsyncSession = Depends(get_read_db),
+    current_user = Depends(get_current_user),
+):
+    link = await db.scalar(select(Link.id).where(Link.short_code == short_code, Link.owner_id == current_user.id))
+    if not link:
+        raise HTTPException(status_code=404, detail="Link not found")
+    # Последние limit интервалов в диапазоне [start, end) по первичному ключу click_rollups
+    query = select(ClickRollup.bucket, ClickRollup.clicks).where(
+        ClickRollup.short_code == short_code,
+        ClickRollup.granularity == granularity,
+    )
+    if start is not None:
+        query = query.where(ClickRollup.bucket >= start)
+    if end is not None:
+        query = query.where(ClickRollup.bucket < end)
+    rows = (await db.execute(query.order_by(ClickRollup.bucket.desc()).limit(limit))).all()
+    return ClickTimeseries(
+        short_code=short_code,
+        granularity=granularity,
+        points=[ClickPoint(bucket=bucket, clicks=clicks) for bucket, clicks in reversed(rows)],
+    )
+
+async def _paginate(db: AsyncSession, query, cursor: Optional[int], limit: int, response: Response):
+    # Keyset-пагинация по id: без OFFSET, цена страницы не зависит от ее номера
+    if cursor is not None:
+        query = query.where(Link.id > cursor)
+    links = (await db.scalars(query.order_by(Link.id).limit(limit + 1))).all()
+    if len(links) > limit:
+        links = links[:limit]
+        response.headers["X-Next-Cursor"] = str(links[-1].id)
     return links
+
+def _stream_links(query, cursor: Optional[int], session_factory) -> StreamingResponse:
+    """
+    Отдает все найденные ссылки в NDJSON. Строки читаются из БД пачками
+    (yield_per) и сериализуются по мере чтения, поэтому память не растет
+    с размером результата.
+    """
+    if cursor is not None:
+        query = query.where(Link.id > cursor)
+    query = query.order_by(Link.id).execution_options(yield_per=LINKS_STREAM_BATCH_SIZE)
+
+    async def rows():
+        # Сессия из зависимости закрывается до отправки тела ответа, поэтому своя
+        async with session_factory() as db:
+            result = await db.stream_scalars(query)
+            async for links in result.partitions():
+                yield "".join(
+                    LinkRead.model_validate(link, from_attributes=True).model_dump_json() + "\n"
+                    for link in links
+                )
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+@router.get("/search", response_model=List[LinkRead])
+async def search_links(
+    original_url: str,
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = Query(LINKS_PAGE_SIZE, ge=1, le=LINKS_MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    session_factory = Depends(get_read_session_factory),
+    current_user = Depends(get_current_user),
+):
+    query = select(Link).where(Link.original_url == original_url, Link.owner_id == current_user.id)
+    if stream:
+        return _stream_links(query, cursor, session_factory)
+    return await _paginate(db, query, cursor, limit, response)
+
+@router.get("", response_model=List[LinkRead])
+async def list_links(
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = Query(LINKS_PAGE_SIZE, ge=1, le=LINKS_MAX_PAGE_SIZE),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    session_factory = Depends(get_read_session_factory),
+    current_user = Depends(get_current_user),
+):
+    query = select(Link).where(Link.owner_id == current_user.id)
+    if stream:
+        return _stream_links(query, cursor, session_factory)
+    return await _paginate(db, query, cursor, limit, response)
@@ -1,7 +1,122 @@
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://postgres:postgres@db:5432/shortener_db")
+
+def to_async_url(url: str) -> str:
+    # Асинхронный драйвер для обработчиков API (asyncpg / aiosqlite)
+    return url.replace("postgresql://", "postgresql+asyncpg://", 1).replace("sqlite://", "sqlite+aiosqlite://", 1)
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
 REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379")
 JWT_SECRET = os.getenv("JWT_SECRET", "your_jwt_secret")
 JWT_ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 дней
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 дней
+
+# Интервал (в секундах) пакетной записи накопленных переходов в БД
+CLICK_FLUSH_INTERVAL = float(os.getenv("CLICK_FLUSH_INTERVAL", "5"))
+
+# Поток переходов в Redis: приблизительная длина, размер пачки читателя,
+# через сколько мс неподтвержденные записи упавшего воркера забирает другой
+CLICK_STREAM_MAXLEN = int(os.getenv("CLICK_STREAM_MAXLEN", "1000000"))
+CLICK_STREAM_BATCH_SIZE = int(os.getenv("CLICK_STREAM_BATCH_SIZE", "1000"))
+CLICK_STREAM_CLAIM_IDLE = int(os.getenv("CLICK_STREAM_CLAIM_IDLE", "60000"))
+# Как часто (секунды) консьюмер забирает зависшие записи других воркеров
+CLICK_STREAM_CLAIM_INTERVAL = float(os.getenv("CLICK_STREAM_CLAIM_INTERVAL", "30"))
+TIMESERIES_MAX_POINTS = int(os.getenv("TIMESERIES_MAX_POINTS", "1440"))
+
+# Пул соединений Redis (один на процесс приложения)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "2"))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1"))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", "30"))
+
+# Кэширование ссылок: Redis (L2) и кэш в памяти процесса (L1)
+LINK_CACHE_TTL = int(os.getenv("LINK_CACHE_TTL", "3600"))
+L1_CACHE_SIZE = int(os.getenv("L1_CACHE_SIZE", "10000"))
+L1_CACHE_TTL = float(os.getenv("L1_CACHE_TTL", "30"))
+
+# Негативное кэширование несуществующих кодов и фильтр Блума по short_code
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", "60"))
+# Истекшая ссылка тоже кэшируется (410 без запроса в БД); PUT с новым сроком перезаписывает ключ
+EXPIRED_CACHE_TTL = int(os.getenv("EXPIRED_CACHE_TTL", "60"))
+BLOOM_FILTER_ENABLED = os.getenv("BLOOM_FILTER_ENABLED", "0") == "1"
+BLOOM_FILTER_SIZE = int(os.getenv("BLOOM_FILTER_SIZE", str(2 ** 27)))  # бит, ~16 МБ
+BLOOM_FILTER_HASHES = int(os.getenv("BLOOM_FILTER_HASHES", "7"))
+
+# Генерация коротких кодов: "sequence" (base62 от последовательности БД) или "random"
+SHORT_CODE_GENERATOR = os.getenv("SHORT_CODE_GENERATOR", "sequence")
+SHORT_CODE_LENGTH = int(os.getenv("SHORT_CODE_LENGTH", "6"))
+SHORT_CODE_BLOCK_SIZE = int(os.getenv("SHORT_CODE_BLOCK_SIZE", "1000"))
+# Смещение, чтобы коды из последовательности сразу были не короче 6 символов
+SHORT_CODE_SEQUENCE_OFFSET = int(os.getenv("SHORT_CODE_SEQUENCE_OFFSET", str(62 ** 5)))
+SHORT_CODE_MAX_ATTEMPTS = int(os.getenv("SHORT_CODE_MAX_ATTEMPTS", "5"))
+
+# Пакетное создание ссылок
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+BULK_INSERT_CHUNK_SIZE = int(os.getenv("BULK_INSERT_CHUNK_SIZE", "1000"))
+# Максимальный размер одного элемента тела: тело читается потоком, целиком в памяти не держится
+BULK_MAX_ITEM_BYTES = int(os.getenv("BULK_MAX_ITEM_BYTES", "65536"))
+
+# Прогрев кэша популярными ссылками (CLI url_shortener.app.warmup и, опционально, при старте)
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "10000"))
+WARMUP_BATCH_SIZE = int(os.getenv("WARMUP_BATCH_SIZE", "1000"))
+# Прогрев при старте - не чаще раза в WARMUP_INTERVAL секунд на все воркеры: gunicorn
+# перезапускает воркеры по max_requests, и каждый перезапуск снова выполняет lifespan
+WARMUP_INTERVAL = int(os.getenv("WARMUP_INTERVAL", "3600"))
+
+# Промахи кэша: блокировка в Redis между воркерами и вероятностное раннее обновление TTL
+CACHE_LOCK_ENABLED = os.getenv("CACHE_LOCK_ENABLED", "1") == "1"
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "2"))
+CACHE_LOCK_POLL_INTERVAL = float(os.getenv("CACHE_LOCK_POLL_INTERVAL", "0.02"))
+CACHE_EARLY_REFRESH = os.getenv("CACHE_EARLY_REFRESH", "0") == "1"
+CACHE_EARLY_REFRESH_BETA = float(os.getenv("CACHE_EARLY_REFRESH_BETA", "1.0"))
+
+# Выдача списков ссылок: размер страницы и пачки чтения при потоковой отдаче
+LINKS_PAGE_SIZE = int(os.getenv("LINKS_PAGE_SIZE", "100"))
+LINKS_MAX_PAGE_SIZE = int(os.getenv("LINKS_MAX_PAGE_SIZE", "1000"))
+LINKS_STREAM_BATCH_SIZE = int(os.getenv("LINKS_STREAM_BATCH_SIZE", "1000"))
+
+# Кэш проверенных JWT (по хешу токена, не дольше exp) и учетных записей пользователей
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# bcrypt: стоимость хеширования и отдельный пул процессов для него.
+# PASSWORD_HASH_CORES - ядра под bcrypt на весь узел (по умолчанию половина), они
+# делятся между воркерами gunicorn (WEB_CONCURRENCY выставляет gunicorn.conf.py),
+# остальные ядра всегда остаются редиректам
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+PASSWORD_HASH_CORES = int(os.getenv("PASSWORD_HASH_CORES", str(max(1, (os.cpu_count() or 1) // 2))))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, PASSWORD_HASH_CORES // WEB_CONCURRENCY))))
+# Приоритет процессов bcrypt ниже воркеров API: при нехватке ядер планировщик отдает их редиректам
+PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", "10"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "1000"))
+
+# Фоновое удаление истекших ссылок (по умолчанию выключено): интервал проходов, размер пачки,
+# пауза между пачками. Ссылка удаляется через REAPER_GRACE_DAYS после истечения: до тех пор
+# редирект отвечает 410, а владелец видит статистику и может продлить срок
+REAPER_ENABLED = os.getenv("REAPER_ENABLED", "0") == "1"
+REAPER_GRACE_DAYS = float(os.getenv("REAPER_GRACE_DAYS", "30"))
+REAPER_INTERVAL = float(os.getenv("REAPER_INTERVAL", "60"))
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", "1000"))
+REAPER_BATCH_PAUSE = float(os.getenv("REAPER_BATCH_PAUSE", "0.1"))
+
+# Метрики Prometheus на /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Пул соединений PostgreSQL одного воркера; при нескольких воркерах
+# WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) < max_connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Реплики PostgreSQL только для чтения (через запятую); пусто - все запросы в основную БД.
+# После записи пользователь REPLICA_STICKY_SECONDS читает из основной БД (задержка репликации)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+ASYNC_DATABASE_REPLICA_URLS = [to_async_url(url) for url in DATABASE_REPLICA_URLS]
+REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
@@ -0,0 +1,168 @@
+"""
+Метрики Prometheus.
+
+Счетчики и гистограммы обновляются на горячем пути (это несколько
+сложений под блокировкой), а состояние пулов читается только при сборе
+метрик, поэтому на обработку запросов не влияет.
+"""
+import os
+import time
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    disable_created_metrics,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Ряды *_created не нужны, а удваивают объем ответа /metrics
+disable_created_metrics()
+
+# Бакеты под быстрые ответы: редирект из кэша занимает доли миллисекунды
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REDIRECT_STAGE_LATENCY = Histogram(
+    "redirect_stage_duration_seconds", "Время этапов редиректа",
+    ["stage"], buckets=LATENCY_BUCKETS,
+)
+LINK_CACHE_REQUESTS = Counter(
+    "link_cache_requests_total", "Обращения к кэшу ссылок link:{code}",
+    ["layer", "result"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "Время выполнения SQL-запроса",
+    ["operation"], buckets=LATENCY_BUCKETS,
+)
+
+# Дочерние метрики с заранее выбранными метками: без поиска по меткам на каждый запрос
+STAGE_CACHE = REDIRECT_STAGE_LATENCY.labels("cache")
+STAGE_BLOOM = REDIRECT_STAGE_LATENCY.labels("bloom")
+STAGE_DB = REDIRECT_STAGE_LATENCY.labels("db")
+STAGE_CLICK = REDIRECT_STAGE_LATENCY.labels("click")
+L1_HIT = LINK_CACHE_REQUESTS.labels("l1", "hit")
+L1_MISS = LINK_CACHE_REQUESTS.labels("l1", "miss")
+REDIS_HIT = LINK_CACHE_REQUESTS.labels("redis", "hit")
+REDIS_NEGATIVE_HIT = LINK_CACHE_REQUESTS.labels("redis", "negative")
+REDIS_MISS = LINK_CACHE_REQUESTS.labels("redis", "miss")
+
+
+class PrometheusMiddleware:
+    """
+    ASGI-middleware: гистограмма времени ответа по шаблону маршрута.
+
+    Метка route - шаблон пути (/links/{short_code}), а не сам путь,
+    чтобы число временных рядов не зависело от числа ссылок.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._paths: dict = {}
+
+    def _route_path(self, scope) -> str:
+        # FastAPI кладет маршрут в scope["route"], у маршрутов Starlette есть только endpoint
+        route = scope.get("route")
+        if route is not None:
+            return route.path
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._paths.get(endpoint)
+        if path is None:
+            path = next((r.path for r in scope["app"].routes if getattr(r, "endpoint", None) is endpoint), "unmatched")
+            self._paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(scope["method"], self._route_path(scope), str(status_code)).observe(
+                time.perf_counter() - started
+            )
+
+
+def instrument_engine(engine):
+    """Время каждого SQL-запроса движка по типу операции (SELECT, INSERT, ...)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+
+class PoolCollector:
+    """Состояние пулов соединений (БД, Redis) и пула bcrypt в момент сбора метрик."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self):
+        from url_shortener.app.db.redis_pool import redis_pool_stats
+        from url_shortener.app.utils.password_hasher import password_hasher
+
+        pool = self.engine.pool
+        db = GaugeMetricFamily("db_pool_connections", "Соединения пула БД", labels=["state"])
+        if hasattr(pool, "checkedout"):
+            db.add_metric(["in_use"], pool.checkedout())
+            db.add_metric(["idle"], pool.checkedin())
+            db.add_metric(["overflow"], max(pool.overflow(), 0))
+            db.add_metric(["size"], pool.size())
+        yield db
+
+        redis = GaugeMetricFamily("redis_pool_connections", "Соединения пула Redis", labels=["state"])
+        for state, value in redis_pool_stats().items():
+            redis.add_metric([state], value)
+        yield redis
+
+        hasher = password_hasher.stats()
+        yield GaugeMetricFamily("password_hash_in_flight", "Задачи bcrypt в пуле процессов", value=hasher["in_flight"])
+        yield GaugeMetricFamily("password_hash_queue_depth", "Задачи bcrypt в очереди", value=hasher["queue_depth"])
+
+
+_pool_collector: PoolCollector | None = None
+
+
+def register_pool_collector(engine):
+    global _pool_collector
+    _pool_collector = PoolCollector(engine)
+    REGISTRY.register(_pool_collector)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    registry = REGISTRY
+    # Под gunicorn (PROMETHEUS_MULTIPROC_DIR) счетчики суммируются по всем воркерам,
+    # пулы соединений показываются для воркера, обработавшего запрос
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        if _pool_collector is not None:
+            registry.register(_pool_collector)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
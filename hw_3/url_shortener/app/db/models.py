@@ -1,8 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, Sequence, func, text
 from sqlalchemy.orm import relationship, declarative_base
+from url_shortener.app.core.config import SHORT_CODE_BLOCK_SIZE
 
 Base = declarative_base()
 
+# Источник ID для коротких кодов: один nextval резервирует блок из SHORT_CODE_BLOCK_SIZE значений.
+# Шаг задается при создании последовательности и должен совпадать с настройкой приложения.
+short_code_seq = Sequence("short_code_seq", start=1, increment=SHORT_CODE_BLOCK_SIZE, metadata=Base.metadata)
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -14,6 +19,21 @@ class User(Base):
 
 class Link(Base):
     __tablename__ = "links"
+    __table_args__ = (
+        # Проверка владельца в stats/update/delete и выборка ссылок пользователя
+        Index("ix_links_owner_id_short_code", "owner_id", "short_code"),
+        # Keyset-пагинация ссылок пользователя по id
+        Index("ix_links_owner_id_id", "owner_id", "id"),
+        # Поиск по точному совпадению URL: hash-индекс не ограничен длиной строки, в отличие от btree
+        Index("ix_links_original_url_hash", "original_url", postgresql_using="hash"),
+        # Выборка истекших ссылок фоновым удалением; бессрочные ссылки в индекс не попадают
+        Index("ix_links_expires_at", "expires_at", postgresql_where=text("expires_at IS NOT NULL")),
+        # Прогрев кэша: первые WARMUP_TOP_N ссылок по популярности без полного скана и сортировки
+        # (NULLS LAST в индексе SQLite не поддерживает, там индекс не создается)
+        Index(
+            "ix_links_popularity", text("click_count DESC"), text("last_click_at DESC NULLS LAST"),
+        ).ddl_if(dialect="postgresql"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     original_url = Column(String, nullable=False)
     short_code = Column(String, unique=True, index=True, nullable=False)
@@ -23,4 +43,13 @@ class Link(Base):
     click_count = Column(Integer, default=0)
     last_click_at = Column(DateTime(timezone=True), nullable=True)
 
-    owner = relationship("User", back_populates="links")
\ No newline at end of file
+    owner = relationship("User", back_populates="links")
+
+class ClickRollup(Base):
+    """Число переходов по ссылке за минуту/час/день (заполняется из потока переходов)."""
+    __tablename__ = "click_rollups"
+    # Первичный ключ покрывает выборку ряда: код, гранулярность, диапазон bucket
+    short_code = Column(String, primary_key=True)
+    granularity = Column(String(6), primary_key=True)
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
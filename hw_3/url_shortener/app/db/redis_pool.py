@@ -0,0 +1,63 @@
+import redis.asyncio as redis
+from url_shortener.app.core.config import (
+    REDIS_URL,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_POOL_TIMEOUT,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_HEALTH_CHECK_INTERVAL,
+)
+
+_pool: redis.BlockingConnectionPool | None = None
+_client: redis.Redis | None = None
+
+
+def init_redis_pool() -> redis.Redis:
+    """
+    Создает общий пул соединений Redis на время жизни приложения.
+
+    BlockingConnectionPool при исчерпании пула ждет свободное соединение
+    (не дольше REDIS_POOL_TIMEOUT), а не открывает новые сокеты.
+    """
+    global _pool, _client
+    if _client is None:
+        _pool = redis.BlockingConnectionPool.from_url(
+            REDIS_URL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            timeout=REDIS_POOL_TIMEOUT,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+            health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
+        )
+        _client = redis.Redis(connection_pool=_pool)
+    return _client
+
+
+async def close_redis_pool():
+    global _pool, _client
+    if _client is not None:
+        await _client.aclose()
+    if _pool is not None:
+        await _pool.disconnect()
+    _pool = None
+    _client = None
+
+
+def get_redis_client() -> redis.Redis:
+    # Ленивая инициализация, если lifespan не запускался (например, в тестах)
+    if _client is None:
+        return init_redis_pool()
+    return _client
+
+
+def redis_pool_stats() -> dict:
+    """Метрики загрузки пула: сколько соединений создано, занято и свободно."""
+    if _pool is None:
+        return {"max_connections": REDIS_MAX_CONNECTIONS, "created": 0, "in_use": 0, "idle": 0}
+    in_use = len(_pool._in_use_connections)
+    idle = len(_pool._available_connections)
+    return {
+        "max_connections": _pool.max_connections,
+        "created": in_use + idle,
+        "in_use": in_use,
+        "idle": idle,
+    }
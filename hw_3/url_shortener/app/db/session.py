@@ -1,6 +1,47 @@
+import itertools
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from url_shortener.app.core.config import DATABASE_URL
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from url_shortener.app.core.config import (
+    DATABASE_URL,
+    ASYNC_DATABASE_URL,
+    ASYNC_DATABASE_REPLICA_URLS,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_TIMEOUT,
+    DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING,
+)
 
+# Синхронный движок: создание схемы и служебные скрипты
 engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _pool_options(url: str) -> dict:
+    # У SQLite (тесты, бенчмарки) свой пул без этих параметров
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+# Асинхронный движок: все обработчики API (пул на процесс-воркер)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Реплики для чтения: у каждой свой движок и пул, сессии выдаются по кругу
+replica_engines = [create_async_engine(url, **_pool_options(url)) for url in ASYNC_DATABASE_REPLICA_URLS]
+_replica_sessions = itertools.cycle([
+    async_sessionmaker(replica, autoflush=False, expire_on_commit=False) for replica in replica_engines
+])
+
+def ReadSessionLocal() -> AsyncSession:
+    """Сессия только для чтения: следующая реплика, а без реплик - основная БД."""
+    if not replica_engines:
+        return AsyncSessionLocal()
+    return next(_replica_sessions)()
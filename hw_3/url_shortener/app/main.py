@@ -1,39 +1,175 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import RedirectResponse
-from datetime import datetime
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import quote
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import select
 from url_shortener.app.api.routers import auth, links
-from url_shortener.app.db.models import Base, Link
-from url_shortener.app.db.session import engine
-from url_shortener.app.api.dependencies import get_db, get_redis
+from url_shortener.app.db.models import Link
+from url_shortener.app.db.session import AsyncSessionLocal, ReadSessionLocal, async_engine, replica_engines
+from url_shortener.app.db.redis_pool import init_redis_pool, close_redis_pool, redis_pool_stats, get_redis_client
+from url_shortener.app.core.config import BLOOM_FILTER_ENABLED, WARMUP_ON_STARTUP, REAPER_ENABLED, METRICS_ENABLED
+from url_shortener.app.core.metrics import (
+    PrometheusMiddleware,
+    instrument_engine,
+    register_pool_collector,
+    metrics_endpoint,
+    STAGE_CACHE,
+    STAGE_BLOOM,
+    STAGE_DB,
+    STAGE_CLICK,
+)
+from url_shortener.app.utils.click_stream import ClickStreamConsumer, emit_click
+from url_shortener.app.utils.link_cache import (
+    MISSING,
+    EXPIRED,
+    link_bloom,
+    get_cached_url,
+    load_through_cache,
+    is_expired,
+    might_exist,
+    listen_invalidations,
+)
+from url_shortener.app.utils.password_hasher import password_hasher
+from url_shortener.app.warmup import warm_up_once
+from url_shortener.app.reaper import run_reaper
+
+# Схема БД создается миграциями Alembic (alembic upgrade head), а не при импорте
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    redis = init_redis_pool()
+    # Пул процессов для bcrypt
+    password_hasher.start()
+    # Фоновая обработка потока переходов: агрегаты и счетчики в БД
+    consumer = ClickStreamConsumer(redis, AsyncSessionLocal)
+    consumer.start()
+    # Инвалидация L1-кэша по сообщениям от других воркеров
+    background = [asyncio.create_task(listen_invalidations(redis))]
+    # Фильтр Блума строится в фоне, если его еще нет; до готовности он ничего не отсекает
+    if BLOOM_FILTER_ENABLED:
+        background.append(asyncio.create_task(link_bloom.ensure_built(redis, AsyncSessionLocal)))
+    # Прогрев Redis популярными ссылками, чтобы после деплоя не было лавины промахов
+    if WARMUP_ON_STARTUP:
+        background.append(asyncio.create_task(warm_up_once(redis, AsyncSessionLocal)))
+    # Удаление истекших ссылок пачками
+    if REAPER_ENABLED:
+        background.append(asyncio.create_task(run_reaper(redis, AsyncSessionLocal)))
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await consumer.stop()
+    await close_redis_pool()
+    password_hasher.shutdown()
 
-# Создаем таблицы при запуске (для разработки)
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="URL Shortener API",
     description="Сервис сокращения ссылок на FastAPI, PostgreSQL и Redis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.include_router(auth.router)
 app.include_router(links.router)
 
-# Редирект по короткому коду: GET /{short_code}
-@app.get("/{short_code}", include_in_schema=False)
-def redirect(short_code: str, db = Depends(get_db), redis = Depends(get_redis)):
-    cache_key = f"link:{short_code}"
-    cached_url = redis.get(cache_key)
+# Метрики Prometheus; маршрут /metrics регистрируется раньше /{short_code}
+if METRICS_ENABLED:
+    app.add_middleware(PrometheusMiddleware)
+    app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+    for engine in (async_engine, *replica_engines):
+        instrument_engine(engine.sync_engine)
+    register_pool_collector(async_engine)
+
+# Метрики пула соединений Redis
+@app.get("/health/redis", include_in_schema=False)
+async def redis_health():
+    return redis_pool_stats()
+
+# Метрики пула процессов bcrypt: занятость и глубина очереди
+@app.get("/health/password-hasher", include_in_schema=False)
+async def password_hasher_health():
+    return password_hasher.stats()
+
+async def _select_link(session_factory, short_code: str):
+    async with session_factory() as db:
+        return (await db.execute(
+            select(Link.original_url, Link.expires_at).where(Link.short_code == short_code)
+        )).first()
+
+async def find_link(short_code: str):
+    # Своя сессия: результат загрузки разделяют все ожидающие запросы
+    row = await _select_link(ReadSessionLocal, short_code)
+    if row is None and replica_engines:
+        # Реплика могла еще не получить новую ссылку: перед негативным кэшированием проверяем основную БД
+        row = await _select_link(AsyncSessionLocal, short_code)
+    return tuple(row) if row else None
+
+async def _record_click(redis, short_code: str, request: Request):
+    with STAGE_CLICK.time():
+        await emit_click(redis, short_code, request.headers.get("referer"), request.headers.get("user-agent"))
+
+
+class FastRedirectResponse(Response):
+    """
+    307 без работы Response.__init__: заголовки собираются сразу в байтах,
+    тело пустое. URL экранируется так же, как в RedirectResponse.
+    """
+
+    def __init__(self, url: str):
+        self.status_code = 307
+        self.background = None
+        self.body = b""
+        self.raw_headers = [
+            (b"location", quote(url, safe=":/%#?=@[]!$&'()*+,;").encode("latin-1")),
+            (b"content-length", b"0"),
+        ]
+
+
+# Ответы об ошибках не зависят от запроса, поэтому создаются один раз
+LINK_NOT_FOUND = JSONResponse({"detail": "Link not found"}, status_code=404)
+LINK_EXPIRED = JSONResponse({"detail": "Link expired"}, status_code=410)
+
+
+async def redirect(request: Request) -> Response:
+    """
+    Редирект по короткому коду: GET /{short_code}.
+
+    Обычный маршрут Starlette, а не FastAPI: без разрешения зависимостей,
+    валидации параметров и исключений. Попадание в кэш - это один поиск в
+    L1/Redis, XADD перехода и готовый 307; сессия БД открывается только
+    при промахе (внутри find_link).
+    """
+    short_code = request.path_params["short_code"]
+    redis = get_redis_client()
+    with STAGE_CACHE.time():
+        cached_url = await get_cached_url(redis, short_code, loader=find_link)
+    if cached_url == MISSING:
+        return LINK_NOT_FOUND
+    if cached_url == EXPIRED:
+        return LINK_EXPIRED
     if cached_url:
-        return RedirectResponse(url=cached_url.decode("utf-8"))
-    from url_shortener.app.db.models import Link
-    link = db.query(Link).filter(Link.short_code == short_code).first()
-    if not link:
-        raise HTTPException(status_code=404, detail="Link not found")
-    if link.expires_at and link.expires_at < datetime.utcnow():
-        raise HTTPException(status_code=410, detail="Link expired")
-    # Обновляем счетчик переходов
-    link.click_count += 1
-    link.last_click_at = datetime.utcnow()
-    db.commit()
-    redis.set(cache_key, link.original_url, ex=3600)
-    return RedirectResponse(url=link.original_url)
\ No newline at end of file
+        await _record_click(redis, short_code, request)
+        return FastRedirectResponse(cached_url)
+    # Несуществующие коды отсекаются фильтром Блума без запроса в БД
+    with STAGE_BLOOM.time():
+        exists = await might_exist(redis, short_code)
+    if not exists:
+        return LINK_NOT_FOUND
+    # Одновременные промахи по одному коду объединяются в один запрос в БД
+    with STAGE_DB.time():
+        link = await load_through_cache(redis, short_code, find_link)
+    if link is None:
+        return LINK_NOT_FOUND
+    original_url, expires_at = link
+    if is_expired(expires_at):
+        return LINK_EXPIRED
+    # Переход уходит в поток Redis, в БД он попадет пакетно
+    await _record_click(redis, short_code, request)
+    return FastRedirectResponse(original_url)
+
+
+# Маршрут-«ловушка» добавляется последним, после всех остальных
+app.add_route("/{short_code}", redirect, methods=["GET"], include_in_schema=False)
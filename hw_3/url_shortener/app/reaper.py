@@ -0,0 +1,100 @@
+"""
+Удаление ссылок, истекших больше REAPER_GRACE_DAYS назад.
+
+Работает фоновой задачей приложения (REAPER_ENABLED) или разово из CLI:
+
+    python -m url_shortener.app.reaper --batch-size 1000 --grace-days 30
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, delete
+from url_shortener.app.db.models import Link, ClickRollup
+from url_shortener.app.core.config import REAPER_INTERVAL, REAPER_BATCH_SIZE, REAPER_BATCH_PAUSE, REAPER_GRACE_DAYS
+from url_shortener.app.utils.link_cache import invalidate_links
+
+logger = logging.getLogger(__name__)
+
+REAPER_LOCK_KEY = "reaper:lock"
+
+
+async def reap_expired_links(
+    redis, session_factory, batch_size: int = REAPER_BATCH_SIZE, pause: float = REAPER_BATCH_PAUSE,
+    grace_days: float = REAPER_GRACE_DAYS,
+) -> int:
+    """
+    Удаляет пачками по batch_size ссылки, истекшие больше grace_days назад.
+
+    Каждая пачка - отдельная короткая транзакция: выборка по индексу
+    ix_links_expires_at с FOR UPDATE SKIP LOCKED (строки, занятые
+    другими транзакциями, пропускаются), DELETE по id и удаление ключей
+    кэша одним пайплайном с рассылкой инвалидаций.
+    """
+    deleted = 0
+    started = time.perf_counter()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=grace_days)
+    while True:
+        async with session_factory() as db:
+            rows = (await db.execute(
+                select(Link.id, Link.short_code)
+                .where(Link.expires_at <= cutoff)
+                .order_by(Link.expires_at)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                break
+            codes = [code for _, code in rows]
+            await db.execute(delete(Link).where(Link.id.in_([link_id for link_id, _ in rows])))
+            await db.execute(delete(ClickRollup).where(ClickRollup.short_code.in_(codes)))
+            await db.commit()
+        await invalidate_links(redis, *codes)
+        deleted += len(rows)
+        if len(rows) < batch_size:
+            break
+        # Пауза между пачками, чтобы не забирать БД у запросов пользователей
+        await asyncio.sleep(pause)
+    if deleted:
+        logger.info("Reaper: deleted %d expired links in %.2f s", deleted, time.perf_counter() - started)
+    return deleted
+
+
+async def run_reaper(redis, session_factory, interval: float = REAPER_INTERVAL):
+    """Фоновая задача: раз в interval секунд удаляет истекшие ссылки."""
+    while True:
+        # При нескольких воркерах проход выполняет только один из них
+        if await redis.set(REAPER_LOCK_KEY, 1, nx=True, ex=max(int(interval), 1)):
+            try:
+                await reap_expired_links(redis, session_factory)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reaper failed")
+        await asyncio.sleep(interval)
+
+
+async def _main(batch_size: int, grace_days: float):
+    from url_shortener.app.db.redis_pool import init_redis_pool, close_redis_pool
+    from url_shortener.app.db.session import AsyncSessionLocal, async_engine
+
+    redis = init_redis_pool()
+    try:
+        await reap_expired_links(redis, AsyncSessionLocal, batch_size, grace_days=grace_days)
+    finally:
+        await close_redis_pool()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Удаление истекших ссылок")
+    parser.add_argument("--batch-size", type=int, default=REAPER_BATCH_SIZE, help="сколько ссылок удалять одной транзакцией")
+    parser.add_argument("--grace-days", type=float, default=REAPER_GRACE_DAYS, help="сколько дней хранить истекшую ссылку")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(_main(args.batch_size, args.grace_days))
+
+
+if __name__ == "__main__":
+    main()
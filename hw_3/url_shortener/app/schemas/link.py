@@ -1,6 +1,6 @@
 from pydantic import BaseModel, HttpUrl, constr
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 class LinkCreate(BaseModel):
     original_url: HttpUrl
@@ -23,3 +23,22 @@ class LinkRead(BaseModel):
 
     class Config:
         orm_mode = True
+
+class BulkLinkResult(BaseModel):
+    index: int
+    short_code: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkLinkResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkLinkResult]
+
+class ClickPoint(BaseModel):
+    bucket: datetime
+    clicks: int
+
+class ClickTimeseries(BaseModel):
+    short_code: str
+    granularity: str
+    points: List[ClickPoint]
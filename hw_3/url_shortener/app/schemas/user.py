@@ -13,6 +13,11 @@ class UserRead(BaseModel):
     class Config:
         orm_mode = True
 
+class CurrentUser(BaseModel):
+    # Облегченная учетная запись для кэша аутентификации (не ORM-объект)
+    id: int
+    email: EmailStr
+
 class Token(BaseModel):
     access_token: str
     token_type: str
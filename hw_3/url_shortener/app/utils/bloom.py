@@ -0,0 +1,107 @@
+import hashlib
+import logging
+from sqlalchemy import select, func
+from url_shortener.app.db.models import Link
+
+logger = logging.getLogger(__name__)
+
+
+class RedisBloomFilter:
+    """
+    Фильтр Блума поверх битовой строки Redis, общий для всех воркеров.
+
+    Ложноотрицательных ответов нет: если might_contain вернул False, кода
+    точно нет в БД. Удаленные коды остаются в фильтре до перестроения
+    (это дает лишь ложноположительный ответ и обычный запрос в БД).
+    """
+
+    def __init__(self, key: str, size_bits: int, num_hashes: int):
+        self.key = key
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        self.tmp_key = f"{key}:tmp"
+        # Признак идущего перестроения: новые коды пишутся и в tmp_key
+        self.rebuilding_key = f"{key}:rebuilding"
+
+    def _positions(self, item: str) -> list[int]:
+        # Двойное хеширование: k позиций из одного 128-битного дайджеста
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.num_hashes)]
+
+    async def _setbits(self, redis, items, keys: list[str], check_rebuild: bool = False) -> bool:
+        async with redis.pipeline(transaction=False) as pipe:
+            if check_rebuild:
+                pipe.exists(self.rebuilding_key)
+            for key in keys:
+                for item in items:
+                    for pos in self._positions(item):
+                        pipe.setbit(key, pos, 1)
+            results = await pipe.execute()
+        return bool(results[0]) if check_rebuild else False
+
+    async def add(self, redis, *items: str, key: str | None = None):
+        if key is not None:
+            await self._setbits(redis, items, [key])
+            return
+        if await self._setbits(redis, items, [self.key], check_rebuild=True):
+            # Идет перестроение: скан мог не увидеть строку, закоммиченную после
+            # его начала, а RENAME затрет рабочий ключ. Пишем и во временный ключ,
+            # затем еще раз в рабочий - на случай, если подмена уже произошла.
+            await self._setbits(redis, items, [self.tmp_key, self.key])
+
+    async def might_contain(self, redis, item: str) -> bool:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.exists(self.key)
+            for pos in self._positions(item):
+                pipe.getbit(self.key, pos)
+            exists, *bits = await pipe.execute()
+        # Пока фильтр не построен, ничего не отсекаем
+        return not exists or all(bits)
+
+    async def ensure_built(self, redis, session_factory):
+        """
+        Строит фильтр, только если его нет в Redis (первый запуск, Redis без данных).
+
+        Построенный фильтр поддерживается add() при создании ссылок, поэтому
+        воркеры, которые gunicorn перезапускает по max_requests, его не перестраивают.
+        """
+        if not await redis.exists(self.key):
+            await self.rebuild(redis, session_factory)
+
+    async def rebuild(self, redis, session_factory, batch_size: int = 10000, lock_ttl: int = 600):
+        """
+        Перестраивает фильтр по таблице links во временном ключе и атомарно
+        подменяет им рабочий. Выполняется одним воркером (блокировка в Redis).
+        """
+        lock_key = f"{self.key}:rebuild-lock"
+        if not await redis.set(lock_key, 1, nx=True, ex=lock_ttl):
+            return
+        tmp_key = self.tmp_key
+        try:
+            await redis.delete(tmp_key)
+            # С этого момента add() пишет новые коды и в tmp_key: строки, которые
+            # закоммитятся после начала скана (например, долгая пакетная вставка), не потеряются
+            await redis.set(self.rebuilding_key, 1, ex=lock_ttl)
+            async with session_factory() as db:
+                max_id = await db.scalar(select(func.coalesce(func.max(Link.id), 0)))
+                result = await db.stream_scalars(
+                    select(Link.short_code).where(Link.id <= max_id).execution_options(yield_per=batch_size)
+                )
+                count = 0
+                async for codes in result.partitions():
+                    await self.add(redis, *codes, key=tmp_key)
+                    count += len(codes)
+            # SETBIT по несуществующему ключу его создает; пустая таблица - пустой фильтр
+            await redis.setbit(tmp_key, self.size_bits - 1, 0)
+            await redis.rename(tmp_key, self.key)
+            await redis.delete(self.rebuilding_key)
+            # Страховка: коды с id > max_id еще раз добавляем в новый рабочий ключ
+            async with session_factory() as db:
+                new_codes = (await db.scalars(select(Link.short_code).where(Link.id > max_id))).all()
+            if new_codes:
+                await self.add(redis, *new_codes)
+            logger.info("Bloom filter %s rebuilt with %d codes", self.key, count + len(new_codes))
+        finally:
+            await redis.delete(self.rebuilding_key, lock_key)
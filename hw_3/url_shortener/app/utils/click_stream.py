@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+from redis.exceptions import ResponseError
+from sqlalchemy.dialects import postgresql, sqlite
+from url_shortener.app.db.models import ClickRollup
+from url_shortener.app.core.config import (
+    CLICK_FLUSH_INTERVAL,
+    CLICK_STREAM_MAXLEN,
+    CLICK_STREAM_BATCH_SIZE,
+    CLICK_STREAM_CLAIM_IDLE,
+    CLICK_STREAM_CLAIM_INTERVAL,
+)
+from url_shortener.app.utils.clicks import ClickBuffer, UPDATE_CLICKS
+
+logger = logging.getLogger(__name__)
+
+CLICK_STREAM_KEY = "clicks:stream"
+CLICK_STREAM_GROUP = "clicks:rollup"
+
+# Гранулярность агрегатов и усечение времени до начала интервала
+GRANULARITIES = {
+    "minute": lambda ts: ts.replace(second=0, microsecond=0),
+    "hour": lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+    "day": lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+
+async def emit_click(redis, short_code: str, referrer: str | None, user_agent: str | None):
+    """
+    Единственная работа редиректа по учету перехода: XADD в поток.
+
+    Время события - ID записи, который Redis присваивает при XADD.
+    MAXLEN ~ обрезает поток целыми узлами, поэтому XADD остается O(1).
+    """
+    await redis.xadd(
+        CLICK_STREAM_KEY,
+        {"code": short_code, "ref": referrer or "", "ua": user_agent or ""},
+        maxlen=CLICK_STREAM_MAXLEN,
+        approximate=True,
+    )
+
+
+def event_time(entry_id: bytes) -> datetime:
+    # ID записи потока: "<миллисекунды>-<номер>"
+    ms = int(entry_id.split(b"-", 1)[0])
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
+
+
+def rollup_rows(events: list[tuple[str, datetime]]) -> list[dict]:
+    """Сворачивает события (код, время) в строки агрегатов по всем гранулярностям."""
+    counts: dict[tuple, int] = {}
+    for short_code, ts in events:
+        for granularity, truncate in GRANULARITIES.items():
+            key = (short_code, granularity, truncate(ts))
+            counts[key] = counts.get(key, 0) + 1
+    return [
+        {"short_code": code, "granularity": granularity, "bucket": bucket, "clicks": n}
+        for (code, granularity, bucket), n in counts.items()
+    ]
+
+
+class ClickStreamConsumer:
+    """
+    Фоновый читатель потока переходов в группе потребителей.
+
+    Каждая пачка одной транзакцией добавляется к агрегатам click_rollups
+    (INSERT ... ON CONFLICT DO UPDATE clicks = clicks + n) и к click_count
+    ссылок, после чего подтверждается XACK. Неподтвержденные записи
+    (сбой БД, упавший воркер) перечитываются, т.е. доставка at-least-once:
+    раз в CLICK_STREAM_CLAIM_INTERVAL консьюмер забирает зависшие записи
+    других воркеров и дочитывает свои.
+    """
+
+    def __init__(self, redis, session_factory, interval: float = CLICK_FLUSH_INTERVAL, batch_size: int = CLICK_STREAM_BATCH_SIZE):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        # Финальная обработка при остановке: сначала свои неподтвержденные, затем новые
+        try:
+            await self.drain("0")
+            await self.drain(">")
+        except Exception:
+            logger.exception("Final click stream flush failed")
+
+    async def ensure_group(self):
+        try:
+            await self.redis.xgroup_create(CLICK_STREAM_KEY, CLICK_STREAM_GROUP, id="0", mkstream=True)
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def claim_stale(self):
+        # Забираем записи, которые взял и не подтвердил упавший воркер: постранично, по курсору XAUTOCLAIM
+        start_id = "0-0"
+        while True:
+            response = await self.redis.xautoclaim(
+                CLICK_STREAM_KEY, CLICK_STREAM_GROUP, self.consumer,
+                min_idle_time=CLICK_STREAM_CLAIM_IDLE, start_id=start_id, count=self.batch_size,
+            )
+            start_id = response[0]
+            if start_id in (b"0-0", "0-0"):
+                return
+
+    async def drain(self, last_id: str):
+        # Неполная пачка значит, что читать больше нечего
+        while await self.consume(last_id) == self.batch_size:
+            pass
+
+    async def consume(self, last_id: str) -> int:
+        """Читает и обрабатывает одну пачку: ">" - новые записи, "0" - свои неподтвержденные."""
+        response = await self.redis.xreadgroup(
+            CLICK_STREAM_GROUP, self.consumer, {CLICK_STREAM_KEY: last_id}, count=self.batch_size,
+        )
+        entries = response[0][1] if response else []
+        if not entries:
+            return 0
+        buffer = ClickBuffer()
+        events = []
+        for entry_id, fields in entries:
+            # Запись обрезана MAXLEN, пока ждала подтверждения: остался только ID, подтверждаем ее
+            if not fields:
+                continue
+            short_code = fields[b"code"].decode("utf-8")
+            ts = event_time(entry_id)
+            buffer.record(short_code, ts)
+            events.append((short_code, ts))
+        if events:
+            await self._store(events, buffer.drain())
+        await self.redis.xack(CLICK_STREAM_KEY, CLICK_STREAM_GROUP, *(entry_id for entry_id, _ in entries))
+        return len(entries)
+
+    async def _store(self, events: list[tuple[str, datetime]], counters: list[dict]):
+        async with self.session_factory() as db:
+            conn = await db.connection()
+            insert = postgresql.insert if conn.dialect.name == "postgresql" else sqlite.insert
+            stmt = insert(ClickRollup)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["short_code", "granularity", "bucket"],
+                set_={"clicks": ClickRollup.clicks + stmt.excluded.clicks},
+            )
+            await conn.execute(stmt, rollup_rows(events))
+            await conn.execute(UPDATE_CLICKS, counters)
+            await db.commit()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_claim = 0.0
+        group_ready = False
+        while True:
+            try:
+                if not group_ready:
+                    # При старте и после ошибки: Redis мог быть недоступен или потерять
+                    # группу (перезапуск без данных, FLUSHALL), тогда XREADGROUP отвечает NOGROUP
+                    await self.ensure_group()
+                    group_ready = True
+                if loop.time() >= next_claim:
+                    # При старте, после ошибки и периодически: зависшие записи, затем свои неподтвержденные
+                    await self.claim_stale()
+                    await self.drain("0")
+                    next_claim = loop.time() + CLICK_STREAM_CLAIM_INTERVAL
+                # Под нагрузкой читаем пачки подряд, иначе ждем интервал
+                if await self.consume(">") < self.batch_size:
+                    await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Записи остались неподтвержденными и будут перечитаны
+                logger.exception("Click stream consumer failed")
+                group_ready = False
+                next_claim = 0.0
+                await asyncio.sleep(self.interval)
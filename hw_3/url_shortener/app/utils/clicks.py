@@ -0,0 +1,39 @@
+from datetime import datetime
+from sqlalchemy import update, bindparam
+from url_shortener.app.db.models import Link
+
+# Пакетный UPDATE счетчиков: одна строка параметров {"code", "n", "ts"} на ссылку
+UPDATE_CLICKS = (
+    update(Link)
+    .where(Link.short_code == bindparam("code"))
+    .values(
+        click_count=Link.click_count + bindparam("n"),
+        last_click_at=bindparam("ts"),
+    )
+)
+
+
+class ClickBuffer:
+    """
+    Переходы одной пачки потока, свернутые по ссылкам.
+
+    Консьюмер потока записывает в буфер события пачки, а drain отдает
+    параметры для одного пакетного UPDATE_CLICKS.
+    """
+
+    def __init__(self):
+        self._counts: dict[str, int] = {}
+        self._last_click: dict[str, datetime] = {}
+
+    def record(self, short_code: str, clicked_at: datetime):
+        self._counts[short_code] = self._counts.get(short_code, 0) + 1
+        last = self._last_click.get(short_code)
+        self._last_click[short_code] = max(last, clicked_at) if last else clicked_at
+
+    def drain(self) -> list[dict]:
+        counts, self._counts = self._counts, {}
+        last_click, self._last_click = self._last_click, {}
+        return [
+            {"code": code, "n": n, "ts": last_click[code]}
+            for code, n in counts.items()
+        ]
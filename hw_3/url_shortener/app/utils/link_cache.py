@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from datetime import datetime, timezone
+from redis.exceptions import LockError
+from url_shortener.app.core.config import (
+    LINK_CACHE_TTL,
+    L1_CACHE_SIZE,
+    L1_CACHE_TTL,
+    NEGATIVE_CACHE_TTL,
+    EXPIRED_CACHE_TTL,
+    BLOOM_FILTER_ENABLED,
+    BLOOM_FILTER_SIZE,
+    BLOOM_FILTER_HASHES,
+    CACHE_LOCK_ENABLED,
+    CACHE_LOCK_TIMEOUT,
+    CACHE_LOCK_POLL_INTERVAL,
+    CACHE_EARLY_REFRESH,
+    CACHE_EARLY_REFRESH_BETA,
+)
+from url_shortener.app.core.metrics import L1_HIT, L1_MISS, REDIS_HIT, REDIS_NEGATIVE_HIT, REDIS_MISS
+from url_shortener.app.utils.local_cache import TTLCache
+from url_shortener.app.utils.bloom import RedisBloomFilter
+from url_shortener.app.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Канал Redis pub/sub для рассылки инвалидаций между воркерами
+INVALIDATION_CHANNEL = "links:invalidate"
+
+# Пустое значение в кэше означает, что кода нет в БД (негативное кэширование)
+MISSING = ""
+# Ссылка есть, но срок истек: отвечаем 410 без запроса в БД
+EXPIRED = "!expired"
+# Результат загрузки для истекшей ссылки из кэша: по expires_at вызывающий вернет 410
+EXPIRED_LINK = (EXPIRED, datetime.fromtimestamp(0, tz=timezone.utc))
+
+l1_cache = TTLCache(L1_CACHE_SIZE, L1_CACHE_TTL)
+link_bloom = RedisBloomFilter("bloom:links", BLOOM_FILTER_SIZE, BLOOM_FILTER_HASHES)
+
+_flights = SingleFlight()
+_refresh_tasks: set[asyncio.Task] = set()
+# Скользящая оценка времени загрузки ссылки из БД, нужна для раннего обновления
+_load_time = 0.005
+# Не дождались, пока другой воркер заполнит кэш
+_NOT_READY = object()
+
+
+def cache_key(short_code: str) -> str:
+    return f"link:{short_code}"
+
+
+def is_expired(expires_at: datetime | None) -> bool:
+    if expires_at is None:
+        return False
+    # SQLite возвращает время без часового пояса, считаем его UTC
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= datetime.now(timezone.utc)
+
+
+def cache_ttl(expires_at: datetime | None, ttl: float = LINK_CACHE_TTL) -> int:
+    """TTL ключа ссылки: не дольше ttl и не дольше срока жизни ссылки (0 - уже истекла)."""
+    if expires_at is None:
+        return int(ttl)
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    left = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    return max(0, min(int(ttl), int(left)))
+
+
+async def get_cached_url(redis, short_code: str, loader=None) -> str | None:
+    """
+    Сначала L1 в памяти процесса, затем Redis. MISSING - код точно не существует,
+    EXPIRED - ссылка истекла.
+
+    С CACHE_EARLY_REFRESH и переданным loader горячий ключ перезагружается
+    в фоне незадолго до истечения TTL (вероятностно, по схеме XFetch).
+    """
+    url = l1_cache.get(short_code)
+    if url is not None:
+        L1_HIT.inc()
+        return url
+    L1_MISS.inc()
+    # PTTL в том же пайплайне: L1 не должен пережить ключ Redis (и срок ссылки)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.get(cache_key(short_code))
+        pipe.pttl(cache_key(short_code))
+        cached_url, pttl = await pipe.execute()
+    if cached_url is None:
+        REDIS_MISS.inc()
+        return None
+    (REDIS_HIT if cached_url else REDIS_NEGATIVE_HIT).inc()
+    url = cached_url.decode("utf-8")
+    if CACHE_EARLY_REFRESH and loader is not None and url not in (MISSING, EXPIRED) and _should_refresh_early(pttl):
+        _schedule_refresh(redis, short_code, loader)
+    l1_cache.set(short_code, url, ttl=min(L1_CACHE_TTL, pttl / 1000) if pttl > 0 else L1_CACHE_TTL)
+    return url
+
+
+async def load_through_cache(redis, short_code: str, loader):
+    """
+    Загрузка при промахе кэша: loader(short_code) -> (url, expires_at) | None.
+
+    В пределах воркера одновременно выполняется одна загрузка на код,
+    остальные запросы получают ее результат. С CACHE_LOCK_ENABLED то же
+    обеспечивается между воркерами блокировкой в Redis.
+    """
+    return await _flights.do(short_code, lambda: _load_and_cache(redis, short_code, loader))
+
+
+async def _load_and_cache(redis, short_code: str, loader, wait: bool = True):
+    lock = None
+    if CACHE_LOCK_ENABLED:
+        lock = redis.lock(f"lock:{cache_key(short_code)}", timeout=CACHE_LOCK_TIMEOUT)
+        if not await lock.acquire(blocking=False):
+            lock = None
+            if not wait:
+                return None
+            link = await _wait_for_cache(redis, short_code)
+            if link is not _NOT_READY:
+                return link
+    try:
+        started = time.perf_counter()
+        link = await loader(short_code)
+        _observe_load_time(time.perf_counter() - started)
+        # Результат кэшируется в любом случае: ожидающие воркеры забирают его из Redis
+        if link is None:
+            await cache_missing(redis, short_code)
+        elif is_expired(link[1]):
+            await cache_expired(redis, short_code)
+        else:
+            await set_cached_url(redis, short_code, link[0], link[1])
+        return link
+    finally:
+        if lock is not None:
+            try:
+                await lock.release()
+            except LockError:
+                # Блокировка истекла по таймауту, ее мог взять другой воркер
+                pass
+
+
+async def _wait_for_cache(redis, short_code: str):
+    # Загрузку выполняет другой воркер: ждем, пока он положит результат в Redis
+    deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(CACHE_LOCK_POLL_INTERVAL)
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.get(cache_key(short_code))
+            pipe.exists(f"lock:{cache_key(short_code)}")
+            cached_url, locked = await pipe.execute()
+        if cached_url is not None:
+            url = cached_url.decode("utf-8")
+            if url == MISSING:
+                return None
+            return EXPIRED_LINK if url == EXPIRED else (url, None)
+        if not locked:
+            # Блокировка снята без результата в кэше (загрузка упала): загружаем сами
+            break
+    return _NOT_READY
+
+
+def _observe_load_time(elapsed: float):
+    global _load_time
+    _load_time = 0.9 * _load_time + 0.1 * elapsed
+
+
+def _should_refresh_early(pttl_ms: int) -> bool:
+    # XFetch: чем ближе истечение TTL и дороже загрузка, тем выше вероятность
+    if pttl_ms <= 0:
+        return False
+    return _load_time * CACHE_EARLY_REFRESH_BETA * -math.log(1.0 - random.random()) >= pttl_ms / 1000
+
+
+def _schedule_refresh(redis, short_code: str, loader):
+    key = f"refresh:{short_code}"
+    if _flights.in_flight(key):
+        return
+    task = asyncio.create_task(_flights.do(key, lambda: _load_and_cache(redis, short_code, loader, wait=False)))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+
+async def set_cached_url(redis, short_code: str, url: str, expires_at: datetime | None = None):
+    # Ключ истекает не позже ссылки, поэтому истекшая ссылка не отдается из кэша
+    ttl = cache_ttl(expires_at)
+    if not ttl:
+        return
+    await redis.set(cache_key(short_code), url, ex=ttl)
+    l1_cache.set(short_code, url, ttl=min(L1_CACHE_TTL, ttl))
+
+
+async def cache_links(redis, links: dict[str, tuple[str, datetime | None]], publish: bool = False, batch_size: int = 1000):
+    """
+    Пакетно кладет ссылки {код: (url, expires_at)} в Redis пайплайнами
+    по batch_size команд (прогрев кэша).
+    """
+    items = list(links.items())
+    for start in range(0, len(items), batch_size):
+        async with redis.pipeline(transaction=False) as pipe:
+            for short_code, (url, expires_at) in items[start:start + batch_size]:
+                ttl = cache_ttl(expires_at)
+                if ttl:
+                    pipe.set(cache_key(short_code), url, ex=ttl)
+                # Сбрасываем возможный негативный L1-кэш в других воркерах
+                if publish:
+                    pipe.publish(INVALIDATION_CHANNEL, short_code)
+            await pipe.execute()
+
+
+async def cache_missing(redis, short_code: str):
+    await redis.set(cache_key(short_code), MISSING, ex=NEGATIVE_CACHE_TTL)
+    l1_cache.set(short_code, MISSING, ttl=min(L1_CACHE_TTL, NEGATIVE_CACHE_TTL))
+
+
+async def cache_expired(redis, short_code: str):
+    await redis.set(cache_key(short_code), EXPIRED, ex=EXPIRED_CACHE_TTL)
+    l1_cache.set(short_code, EXPIRED, ttl=min(L1_CACHE_TTL, EXPIRED_CACHE_TTL))
+
+
+async def might_exist(redis, short_code: str) -> bool:
+    # Без фильтра Блума любой код считается возможным
+    if not BLOOM_FILTER_ENABLED:
+        return True
+    return await link_bloom.might_contain(redis, short_code)
+
+
+async def register_new_links(redis, links: dict[str, tuple[str, datetime | None]]):
+    """Пакетно созданные ссылки: фильтр Блума и сразу прогретый кэш."""
+    if BLOOM_FILTER_ENABLED:
+        await link_bloom.add(redis, *links)
+    for short_code in links:
+        l1_cache.delete(short_code)
+    await cache_links(redis, links, publish=True)
+
+
+async def invalidate_links(redis, *short_codes: str):
+    """Удаляет ссылки из Redis и L1 всех воркеров."""
+    for short_code in short_codes:
+        l1_cache.delete(short_code)
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.delete(*(cache_key(code) for code in short_codes))
+        for short_code in short_codes:
+            pipe.publish(INVALIDATION_CHANNEL, short_code)
+        await pipe.execute()
+
+
+async def listen_invalidations(redis, retry_delay: float = 1.0, poll_timeout: float = 1.0):
+    """Фоновая задача: очищает L1 по сообщениям из канала инвалидаций."""
+    while True:
+        pubsub = redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Подписка новая (старт или обрыв соединения): пока ее не было, могли пропустить инвалидации
+            l1_cache.clear()
+            while True:
+                # Тихий канал - норма: с явным таймаутом get_message возвращает None,
+                # а не TimeoutError по socket_timeout общего пула, как listen()
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=poll_timeout)
+                if message is not None:
+                    l1_cache.delete(message["data"].decode("utf-8"))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Invalidation listener failed, reconnecting")
+            await asyncio.sleep(retry_delay)
+        finally:
+            await pubsub.aclose()
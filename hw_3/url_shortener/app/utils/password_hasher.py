@@ -0,0 +1,91 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
+from url_shortener.app.core.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_NICE
+from url_shortener.app.utils.security import get_password_hash, verify_password
+
+
+def _lower_priority(nice: int):
+    # Инициализатор процесса пула (на Windows os.nice нет)
+    if nice and hasattr(os, "nice"):
+        os.nice(nice)
+
+
+class PasswordHasher:
+    """
+    Выполняет bcrypt в отдельном пуле процессов.
+
+    В потоках bcrypt делит GIL и пул потоков Starlette с остальными
+    запросами; в процессах он масштабируется по ядрам. Одновременно в пул
+    отправляется не больше workers задач, остальные ждут на семафоре, а
+    при очереди длиннее max_queue запрос сразу получает 503.
+    """
+
+    def __init__(self, workers: int, max_queue: int, nice: int = 0):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.nice = nice
+        self._executor: ProcessPoolExecutor | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._executor is None:
+            # spawn: fork процесса с запущенным event loop и потоками небезопасен
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(self.nice,),
+            )
+            self._semaphore = asyncio.Semaphore(self.workers)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        self._semaphore = None
+
+    async def _run(self, fn, *args):
+        # Ленивый запуск, если lifespan не выполнялся (например, в тестах)
+        self.start()
+        if self.max_queue and self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many login attempts, retry later")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        """Метрики пула: размер, занятые процессы, глубина очереди, счетчики."""
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE, PASSWORD_HASH_NICE)
@@ -1,9 +1,10 @@
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import jwt
-from url_shortener.app.core.config import JWT_SECRET, JWT_ALGORITHM
+from url_shortener.app.core.config import JWT_SECRET, JWT_ALGORITHM, BCRYPT_ROUNDS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Хеши с другой стоимостью по-прежнему проверяются: rounds хранится в самом хеше
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -1,9 +1,78 @@
+import asyncio
 import string, random
-from url_shortener.app.db.models import Link
+from sqlalchemy import select
+from url_shortener.app.db.models import short_code_seq
+from url_shortener.app.core.config import (
+    SHORT_CODE_GENERATOR,
+    SHORT_CODE_LENGTH,
+    SHORT_CODE_BLOCK_SIZE,
+    SHORT_CODE_SEQUENCE_OFFSET,
+)
 
-def generate_short_code(db, length: int = 6) -> str:
-    characters = string.ascii_letters + string.digits
+ALPHABET = string.digits + string.ascii_letters
+
+def base62_encode(number: int) -> str:
+    if number < 0:
+        raise ValueError("number must be non-negative")
+    digits = []
     while True:
-        code = ''.join(random.choices(characters, k=length))
-        if not db.query(Link).filter(Link.short_code == code).first():
-            return code
\ No newline at end of file
+        number, rem = divmod(number, 62)
+        digits.append(ALPHABET[rem])
+        if number == 0:
+            return "".join(reversed(digits))
+
+def generate_short_code(length: int = SHORT_CODE_LENGTH) -> str:
+    # Уникальность не проверяется: коллизию ловит UNIQUE-индекс при вставке
+    return "".join(random.choices(ALPHABET, k=length))
+
+
+class RandomCodeGenerator:
+    """Случайные коды; при IntegrityError вызывающий код просто берет следующий."""
+
+    async def next_codes(self, db, count: int) -> list[str]:
+        return [generate_short_code() for _ in range(count)]
+
+    async def next_code(self, db) -> str:
+        return (await self.next_codes(db, 1))[0]
+
+
+class SequenceCodeGenerator:
+    """
+    Коды из последовательности Postgres в base62, без запросов на уникальность.
+
+    Последовательность short_code_seq растет с шагом SHORT_CODE_BLOCK_SIZE,
+    поэтому один nextval резервирует за воркером целый диапазон ID,
+    который затем раздается из памяти.
+    """
+
+    def __init__(self, block_size: int = SHORT_CODE_BLOCK_SIZE, offset: int = SHORT_CODE_SEQUENCE_OFFSET):
+        self.block_size = block_size
+        self.offset = offset
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def next_codes(self, db, count: int) -> list[str]:
+        ids = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next >= self._end:
+                    start = await db.scalar(select(short_code_seq.next_value()))
+                    self._next, self._end = start, start + self.block_size
+                take = min(count - len(ids), self._end - self._next)
+                ids.extend(range(self._next, self._next + take))
+                self._next += take
+        return [base62_encode(self.offset + i) for i in ids]
+
+    async def next_code(self, db) -> str:
+        return (await self.next_codes(db, 1))[0]
+
+
+_random_generator = RandomCodeGenerator()
+_sequence_generator = SequenceCodeGenerator()
+
+def get_code_generator(db):
+    # SQLite (локальный запуск, тесты) не поддерживает последовательности
+    if SHORT_CODE_GENERATOR == "sequence" and db.bind.dialect.supports_sequences:
+        return _sequence_generator
+    return _random_generator
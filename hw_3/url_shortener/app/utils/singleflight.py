@@ -0,0 +1,25 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Объединение одновременных вызовов с одинаковым ключом.
+
+    Пока загрузка по ключу выполняется, остальные вызовы ждут ее результат
+    и не запускают свою. Загрузка идет отдельной задачей, поэтому отмена
+    запроса, который ее начал, не затрагивает остальных ожидающих.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._inflight
@@ -0,0 +1,84 @@
+"""
+Прогрев Redis самыми популярными ссылками.
+
+Запуск из CLI (например, после деплоя или очистки Redis):
+
+    python -m url_shortener.app.warmup --top 100000 --batch-size 1000
+"""
+import argparse
+import asyncio
+import logging
+import time
+from sqlalchemy import select, or_, func
+from url_shortener.app.db.models import Link
+from url_shortener.app.core.config import WARMUP_TOP_N, WARMUP_BATCH_SIZE, WARMUP_INTERVAL
+from url_shortener.app.utils.link_cache import cache_links
+
+logger = logging.getLogger(__name__)
+
+WARMUP_LOCK_KEY = "warmup:lock"
+
+
+async def warm_up_cache(redis, session_factory, top_n: int = WARMUP_TOP_N, batch_size: int = WARMUP_BATCH_SIZE) -> int:
+    """
+    Загружает в Redis top_n ссылок по click_count/last_click_at.
+
+    Строки читаются серверным курсором пачками по batch_size и пишутся
+    пайплайном SET ... EX, поэтому память не зависит от top_n.
+    """
+    query = (
+        select(Link.short_code, Link.original_url, Link.expires_at)
+        .where(or_(Link.expires_at.is_(None), Link.expires_at > func.now()))
+        .order_by(Link.click_count.desc(), Link.last_click_at.desc().nulls_last())
+        .limit(top_n)
+        .execution_options(yield_per=batch_size)
+    )
+    loaded = 0
+    started = time.perf_counter()
+    async with session_factory() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            await cache_links(redis, {code: (url, expires_at) for code, url, expires_at in rows}, batch_size=batch_size)
+            loaded += len(rows)
+            elapsed = time.perf_counter() - started
+            logger.info("Warm-up: %d/%d links, %.0f links/s", loaded, top_n, loaded / elapsed if elapsed else 0)
+    elapsed = time.perf_counter() - started
+    logger.info("Warm-up finished: %d links in %.2f s", loaded, elapsed)
+    return loaded
+
+
+async def warm_up_once(redis, session_factory, interval: int = WARMUP_INTERVAL) -> int:
+    # При нескольких воркерах прогрев выполняет только один из них. После успеха
+    # блокировка остается до истечения TTL, поэтому перезапущенные воркеры его не повторяют
+    if not await redis.set(WARMUP_LOCK_KEY, 1, nx=True, ex=interval):
+        return 0
+    try:
+        return await warm_up_cache(redis, session_factory)
+    except BaseException:
+        await redis.delete(WARMUP_LOCK_KEY)
+        raise
+
+
+async def _main(top_n: int, batch_size: int):
+    from url_shortener.app.db.redis_pool import init_redis_pool, close_redis_pool
+    from url_shortener.app.db.session import AsyncSessionLocal, async_engine
+
+    redis = init_redis_pool()
+    try:
+        await warm_up_cache(redis, AsyncSessionLocal, top_n, batch_size)
+    finally:
+        await close_redis_pool()
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Прогрев кэша Redis популярными ссылками")
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_N, help="сколько ссылок загрузить")
+    parser.add_argument("--batch-size", type=int, default=WARMUP_BATCH_SIZE, help="размер пачки курсора и пайплайна")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    asyncio.run(_main(args.top, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
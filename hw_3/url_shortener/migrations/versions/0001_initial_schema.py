@@ -0,0 +1,64 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from url_shortener.app.core.config import SHORT_CODE_BLOCK_SIZE
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # База, созданная прежней версией приложения через create_all, уже содержит
+    # таблицы и индексы: создаем только недостающее, без alembic stamp
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+    if "users" not in existing:
+        _create_users()
+    if "links" not in existing:
+        _create_links()
+    # В схеме create_all последовательности нет
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(
+            sa.Sequence("short_code_seq", start=1, increment=SHORT_CODE_BLOCK_SIZE), if_not_exists=True,
+        ))
+
+
+def _create_users():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("password_hash", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+
+def _create_links():
+    op.create_table(
+        "links",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("original_url", sa.String(), nullable=False),
+        sa.Column("short_code", sa.String(), nullable=False),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("click_count", sa.Integer(), nullable=True),
+        sa.Column("last_click_at", sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index("ix_links_id", "links", ["id"])
+    op.create_index("ix_links_short_code", "links", ["short_code"], unique=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.DropSequence(sa.Sequence("short_code_seq")))
+    op.drop_table("links")
+    op.drop_table("users")
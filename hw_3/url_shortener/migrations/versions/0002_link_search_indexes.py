@@ -0,0 +1,32 @@
+"""indexes for owner-scoped lookups and search by original_url
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись в links на время построения индекса,
+    # но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_owner_id_short_code", "links", ["owner_id", "short_code"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_links_original_url_hash", "links", ["original_url"],
+            postgresql_using="hash", postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_links_original_url_hash", "links", postgresql_concurrently=True)
+        op.drop_index("ix_links_owner_id_short_code", "links", postgresql_concurrently=True)
@@ -0,0 +1,28 @@
+"""click_rollups table for time-bucketed click analytics
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "click_rollups",
+        sa.Column("short_code", sa.String(), nullable=False),
+        sa.Column("granularity", sa.String(length=6), nullable=False),
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("clicks", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("short_code", "granularity", "bucket"),
+    )
+
+
+def downgrade():
+    op.drop_table("click_rollups")
@@ -0,0 +1,28 @@
+"""ensure short_code_seq exists on databases stamped at 0001
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+from url_shortener.app.core.config import SHORT_CODE_BLOCK_SIZE
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Базы из create_all, помеченные `alembic stamp 0001` по прежней инструкции,
+    # пропустили создание последовательности в 0001
+    if op.get_bind().dialect.supports_sequences:
+        op.execute(sa.schema.CreateSequence(
+            sa.Sequence("short_code_seq", start=1, increment=SHORT_CODE_BLOCK_SIZE), if_not_exists=True,
+        ))
+
+
+def downgrade():
+    # Последовательность принадлежит 0001 и удаляется ее downgrade
+    pass
@@ -0,0 +1,32 @@
+"""index for the cache warm-up query by popularity
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Порядок как в warm_up_cache: ORDER BY click_count DESC, last_click_at DESC NULLS LAST
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_links_popularity", "links",
+            [sa.text("click_count DESC"), sa.text("last_click_at DESC NULLS LAST")],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_links_popularity", "links", postgresql_concurrently=True)